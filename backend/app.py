@@ -1,101 +1,102 @@
 #import eventlet
 #eventlet.monkey_patch()
 
-from flask import Flask, jsonify, request
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_socketio import SocketIO, emit, join_room, leave_room
-from flask_cors import CORS
+from flask import Blueprint, Flask, current_app, jsonify, request
+from flask_socketio import emit, leave_room
 import os
 import datetime
 import json
+import math
 import uuid
 
-from google.oauth2 import id_token
-from google.auth.transport import requests
+import click
 
-app = Flask(__name__)
-
-env_cors_str = os.environ.get('CORS_ALLOWED_ORIGINS')
-
-if env_cors_str == '*':
-    cors_config = '*'
-    print("CORS: Permitindo todas as origens ('*').")
-elif env_cors_str:
-    cors_config = [origin.strip() for origin in env_cors_str.split(',')]
-    print(f"CORS: Origens permitidas configuradas via variável de ambiente: {cors_config}")
-else:
-    cors_config = ["https://elc1090.github.io"]
-    print(f"CORS: Variável de ambiente CORS_ALLOWED_ORIGINS não definida. Usando fallback: {cors_config}")
-
-DATABASE_URL = os.environ.get('DATABASE_URL')
-if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL or f'sqlite:///{os.path.join(app.instance_path, "desenho_local.db")}'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Configura o CORS para todas as rotas da aplicação Flask
-CORS(app, origins=cors_config, supports_credentials=True)
-
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-socketio = SocketIO(app, cors_allowed_origins=cors_config, async_mode='gevent')
-
-# Tabela de associação para o acesso do usuário aos quadros
-whiteboard_access = db.Table('whiteboard_access',
-    db.Column('user_id', db.String(255), db.ForeignKey('users.id'), primary_key=True),
-    db.Column('whiteboard_id', db.Integer, db.ForeignKey('whiteboards.id'), primary_key=True)
+from database import configure_database, pool_stats, REPLICA_BIND_KEY, REPLICA_MAX_LAG_SECONDS
+from extensions import db, migrate, socketio, cors
+from models import (
+    DEFAULT_BOARD_ID, User, Whiteboard, Stroke,
+    whiteboard_access, read_execute, has_board_access, delete_whiteboard_rows, bump_boards_version,
+)
+from history import (
+    record_board_event, ensure_history_baseline, maybe_checkpoint_board, board_at, parse_history_timestamp,
+    forget_board_history, stream_board_replay, active_replays,
 )
+from archive import (
+    ARCHIVE_IDLE_DAYS, ARCHIVE_INTERVAL_SECONDS, archive_stats, archive_idle_boards,
+    archive_job_loop, rehydrate_board,
+)
+import board_list_cache
+import compression
+import eraser
+import lod
+import presence
+import profiling
+import reads
+from store import socketio_message_queue
+from retention import RETENTION_INTERVAL_SECONDS, purge_expired, retention_job_loop, retention_stats
+
+# Rotas REST e comandos `flask ...`; os handlers do Socket.IO ficam registrados no `socketio` global
+bp = Blueprint('main', __name__, cli_group=None)
+
+
+def cors_origins_from_env():
+    """Lê CORS_ALLOWED_ORIGINS e devolve (origens, mensagem para o log)."""
+    env_cors_str = os.environ.get('CORS_ALLOWED_ORIGINS')
+
+    if env_cors_str == '*':
+        return '*', "CORS: Permitindo todas as origens ('*')."
+    if env_cors_str:
+        cors_config = [origin.strip() for origin in env_cors_str.split(',')]
+        return cors_config, f"CORS: Origens permitidas configuradas via variável de ambiente: {cors_config}"
+    cors_config = ["https://elc1090.github.io"]
+    return cors_config, f"CORS: Variável de ambiente CORS_ALLOWED_ORIGINS não definida. Usando fallback: {cors_config}"
 
-class User(db.Model):
-    __tablename__ = 'users'
 
-    id = db.Column(db.String(255), primary_key=True) # Google's user ID
-    name = db.Column(db.String(255), nullable=False)
-    email = db.Column(db.String(255), unique=True, nullable=False)
-    profile_pic = db.Column(db.String(255), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    is_guest = db.Column(db.Boolean, default=False, nullable=False)
+def create_app():
+    """Cria e configura a aplicação. Nada é montado na importação deste módulo."""
+    app = Flask(__name__)
 
-    owned_whiteboards = db.relationship('Whiteboard', backref='owner', lazy='dynamic')
-    accessible_whiteboards = db.relationship('Whiteboard', secondary=whiteboard_access, back_populates='accessible_by_users', lazy='dynamic')
+    cors_config, cors_message = cors_origins_from_env()
 
-    def __repr__(self):
-        return f'<User id={self.id} name={self.name}>'
+    # DATABASE_URL, DATABASE_REPLICA_URL e DB_POOL_* (ver database.py)
+    _, replica_url = configure_database(
+        app, f'sqlite:///{os.path.join(app.instance_path, "desenho_local.db")}'
+    )
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-class Whiteboard(db.Model):
-    __tablename__ = 'whiteboards'
+    # Configura o CORS para todas as rotas da aplicação Flask
+    cors.init_app(app, origins=cors_config, supports_credentials=True)
 
-    id = db.Column(db.Integer, primary_key=True)
-    nickname = db.Column(db.String(100), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    owner_id = db.Column(db.String(255), db.ForeignKey('users.id'), nullable=False)
-    
-    strokes = db.relationship('Stroke', backref='whiteboard', lazy=True, cascade="all, delete-orphan")
-    accessible_by_users = db.relationship('User', secondary=whiteboard_access, back_populates='accessible_whiteboards', lazy='dynamic')
+    db.init_app(app)
+    migrate.init_app(app, db)
+    socketio.init_app(app, cors_allowed_origins=cors_config, async_mode='gevent',
+                      message_queue=socketio_message_queue(), **compression.socketio_options())
+    app.register_blueprint(bp)
+    profiling.init_app(app)
 
-    def __repr__(self):
-        return f'<Whiteboard id={self.id} nickname={self.nickname}>'
+    # O log da configuração sai de uma vez, só depois que tudo foi montado
+    config_messages = [cors_message]
+    if replica_url:
+        config_messages.append("DB: Réplica de leitura configurada; entrada em lousas e listagens serão lidas dela.")
+    print('\n'.join(config_messages))
 
-class Stroke(db.Model):
-    __tablename__ = 'stroke' # Nome explícito da tabela
+    return app
 
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.String(255), db.ForeignKey('users.id'), nullable=False)
-    whiteboard_id = db.Column(db.Integer, db.ForeignKey('whiteboards.id'), nullable=False)
-    
-    color = db.Column(db.String(7), nullable=False) # Ex: #RRGGBB
-    line_width = db.Column(db.Float, nullable=False)
-    
-    points_json = db.Column(db.Text, nullable=False) # [{"x":10,"y":20},{"x":12,"y":22}, ...]
 
-    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow) # Quando o traço foi concluído/salvo
+def start_background_jobs(app):
+    """Inicia os jobs periódicos habilitados por variável de ambiente.
 
-    def __repr__(self):
-        return f'<Stroke id={self.id} board_id={self.whiteboard_id} color={self.color}>'
+    Chamado pelo hook post_worker_init do gunicorn.conf.py e pelo servidor de desenvolvimento.
+    """
+    socketio.start_background_task(presence.presence_job_loop, socketio)
+    if ARCHIVE_INTERVAL_SECONDS > 0:
+        socketio.start_background_task(archive_job_loop, app)
+        print(f"Job de arquivamento ativo: a cada {ARCHIVE_INTERVAL_SECONDS}s, lousas inativas há {ARCHIVE_IDLE_DAYS} dias.")
+    if RETENTION_INTERVAL_SECONDS > 0:
+        socketio.start_background_task(retention_job_loop, app)
+        print(f"Job de retenção ativo: a cada {RETENTION_INTERVAL_SECONDS}s.")
 
-@app.cli.command("ensure_default_whiteboard")
+@bp.cli.command("ensure_default_whiteboard")
 def ensure_default_whiteboard():
     """Garante que a lousa padrão (ID 1) exista."""
     default_board = Whiteboard.query.get(1)
@@ -116,78 +117,182 @@ def ensure_default_whiteboard():
     else:
         print("Lousa padrão (ID 1) já existe.")
 
-@app.route('/')
+@bp.cli.command("build_stroke_lods")
+@click.option('--rebuild', is_flag=True, help='Recalcula também os traços que já têm níveis (ex.: após mudar as tolerâncias).')
+def build_stroke_lods(rebuild):
+    """Calcula os níveis de detalhe dos traços antigos, salvos antes do LOD existir."""
+    batch_size = 500
+    total = 0
+    last_id = 0
+    while True:
+        query = Stroke.query.filter(Stroke.id > last_id)
+        if not rebuild:
+            query = query.filter(Stroke.lod_json.is_(None))
+        batch = query.order_by(Stroke.id).limit(batch_size).all()
+        if not batch:
+            break
+        for stroke in batch:
+            stroke.lod_json = lod.dumps_lods(json.loads(stroke.points_json))
+        last_id = batch[-1].id
+        db.session.commit()
+        total += len(batch)
+        print(f"{total} traços processados...")
+    print(f"Níveis de detalhe calculados para {total} traços.")
+
+@bp.cli.command("archive_boards")
+@click.option('--idle-days', type=int, default=None, help='Dias sem atividade (padrão: ARCHIVE_IDLE_DAYS).')
+@click.option('--limit', type=int, default=None, help='Máximo de lousas arquivadas nesta execução.')
+def archive_boards(idle_days, limit):
+    """Compacta os traços das lousas inativas em um único registro por lousa."""
+    archived = archive_idle_boards(idle_days, limit)
+    if archived:
+        average_ms = archive_stats['archive_seconds_total'] / archived * 1000
+        print(f"{archived} lousas arquivadas ({archive_stats['strokes_archived']} traços, média de {average_ms:.1f} ms por lousa).")
+    else:
+        print("Nenhuma lousa inativa para arquivar.")
+
+@bp.cli.command("purge_expired")
+def purge_expired_command():
+    """Remove traços e lousas de convidados vencidos pelas políticas de retenção."""
+    strokes, boards = purge_expired()
+    print(f"Retenção aplicada: {strokes} traços e {boards} lousas removidos em {retention_stats['last_purge_seconds']}s.")
+
+@bp.cli.command("generate_dataset")
+@click.option('--seed', type=int, default=1, show_default=True, help='Semente; a mesma semente gera a mesma base.')
+@click.option('--users', type=int, default=2000, show_default=True)
+@click.option('--boards', type=int, default=200, show_default=True, help='Lousas além da principal.')
+@click.option('--strokes', default='100:10000', show_default=True, help='Faixa MIN:MAX de traços por lousa (log-uniforme).')
+@click.option('--default-board-strokes', type=int, default=20000, show_default=True, help='Traços na lousa principal.')
+@click.option('--default-member-ratio', type=float, default=0.95, show_default=True, help='Fração dos usuários com acesso à lousa principal.')
+@click.option('--guest-ratio', type=float, default=0.3, show_default=True, help='Fração de usuários convidados.')
+@click.option('--median-points', type=int, default=60, show_default=True, help='Mediana de pontos por traço.')
+@click.option('--max-points', type=int, default=2000, show_default=True)
+@click.option('--days', type=int, default=180, show_default=True, help='Período coberto pelas datas de criação.')
+@click.option('--end-date', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Fim do período (padrão: hoje). Fixe para reproduzir as datas.')
+@click.option('--with-lods', is_flag=True, help='Calcula os níveis de detalhe na hora (bem mais lento; ou rode build_stroke_lods depois).')
+def generate_dataset_command(seed, users, boards, strokes, default_board_strokes, default_member_ratio, guest_ratio,
+                             median_points, max_points, days, end_date, with_lods):
+    """Gera uma base sintética grande e reproduzível, direto nas tabelas."""
+    from dataset import generate_dataset
+
+    strokes_min, _, strokes_max = strokes.partition(':')
+    try:
+        strokes_min, strokes_max = int(strokes_min), int(strokes_max or strokes_min)
+    except ValueError:
+        raise click.BadParameter(f"use MIN:MAX, não {strokes!r}", param_hint='--strokes')
+    started = datetime.datetime.utcnow()
+    try:
+        counts = generate_dataset(
+            seed, users, boards, strokes_min, strokes_max, default_board_strokes,
+            default_member_ratio=default_member_ratio, guest_ratio=guest_ratio, median_points=median_points,
+            max_points=max_points, days=days, end_date=end_date, with_lods=with_lods,
+        )
+    except ValueError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    elapsed = (datetime.datetime.utcnow() - started).total_seconds()
+    print(f"Base gerada em {elapsed:.1f}s: {counts['users']} usuários, {counts['boards']} lousas, "
+          f"{counts['access']} acessos, {counts['strokes']} traços ({counts['points']} pontos).")
+
+@bp.cli.command("profiler")
+@click.argument('action', type=click.Choice(['start', 'stop', 'status']))
+@click.option('--url', default=lambda: os.environ.get('PROFILER_SERVER_URL', 'http://localhost:5000'), help='Endereço do servidor em execução.')
+@click.option('--interval-ms', type=float, default=None, help='Intervalo entre amostras (padrão: PROFILER_INTERVAL_MS).')
+@click.option('--seconds', type=float, default=None, help='Desliga sozinho depois de N segundos.')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='No stop, grava as pilhas também neste arquivo local.')
+def profiler_command(action, url, interval_ms, seconds, output):
+    """Liga/desliga o profiler de um servidor em execução (o profiler roda no processo dele)."""
+    import urllib.request
+
+    endpoint = f"{url.rstrip('/')}/api/admin/profiler"
+    headers = {'X-Admin-Token': profiling.PROFILER_ADMIN_TOKEN, 'Content-Type': 'application/json'}
+    if action == 'status':
+        req = urllib.request.Request(endpoint, headers=headers)
+    else:
+        body = json.dumps({'action': action, 'interval_ms': interval_ms, 'seconds': seconds}).encode('utf-8')
+        req = urllib.request.Request(endpoint, data=body, headers=headers, method='POST')
+    with urllib.request.urlopen(req) as response:
+        result = json.loads(response.read())
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+    if action == 'stop' and output:
+        req = urllib.request.Request(f"{endpoint}?format=folded", headers=headers)
+        with urllib.request.urlopen(req) as response, open(output, 'wb') as target:
+            target.write(response.read())
+        print(f"Pilhas gravadas em {output}.")
+
+@bp.route('/')
 def home():
     return "Backend Flask com SQLAlchemy e modelos Whiteboard/Stroke."
 
-@app.route('/api/status')
+@bp.route('/api/status')
 def status_api():
     try:
         db.session.execute(db.text('SELECT 1'))
         db_status = "conectado"
     except Exception as e:
         db_status = f"desconectado ({type(e).__name__}: {e})"
-    return jsonify(message="API Flask está rodando!", database_status=db_status)
 
-DEFAULT_BOARD_ID = 1
+    pools = {'primary': pool_stats(db.engine)}
+    if REPLICA_BIND_KEY in db.engines:
+        pools['replica'] = pool_stats(db.engines[REPLICA_BIND_KEY])
+    return jsonify(message="API Flask está rodando!", database_status=db_status, database_pools=pools, archive=archive_stats,
+                   retention=retention_stats, eraser=eraser.eraser_stats, presence=presence.report(), socket_payloads=compression.report(), board_list_cache=board_list_cache.report())
+
 # Dicionário para rastrear SIDs de convidados e seus user_ids
 guest_sids = {}
 # Dicionário para o histórico de "refazer"
 redo_stacks = {} # Formato: { "user_id": [stroke_data, ...], ... }
 
 @socketio.on('connect')
+@profiling.trace_event('connect')
 def handle_connect():
     """Chamado quando um cliente se conecta, mas não entra em nenhuma sala de lousa ainda."""
     print(f"Cliente {request.sid} conectado ao servidor.")
     emit('connection_established', {'message': 'Conectado ao servidor Socket.IO!', 'sid': request.sid})
 
 @socketio.on('join_board')
+@profiling.trace_event('join_board')
 def handle_join_board(data):
     """Chamado quando um cliente quer se juntar a uma lousa específica."""
     board_id = data.get('board_id')
     user_email = data.get('user_email') # O frontend precisa enviar o email do usuário
+    # Escala atual do viewport do cliente; sem ela, os traços vão com todos os pontos
+    lod_level = lod.level_for_scale(data.get('scale'))
 
     if not board_id or not user_email:
         print(f"Tentativa de join sem board_id ou user_email pelo cliente {request.sid}")
         return
         
-    user = User.query.filter_by(email=user_email).first()
-    if not user:
+    # Usuário, lousa, dono, acesso e arquivamento em uma única consulta
+    context, from_primary = reads.join_context(board_id, user_email)
+    if not context:
         print(f"Usuário com email {user_email} não encontrado.")
         return
 
     # Se o usuário for um convidado, rastreia seu SID para limpeza posterior
-    if user.is_guest:
-        guest_sids[request.sid] = user.id
-        print(f"Convidado {user.name} (SID: {request.sid}) rastreado para limpeza.")
+    if context.is_guest:
+        guest_sids[request.sid] = context.id
+        print(f"Convidado {context.name} (SID: {request.sid}) rastreado para limpeza.")
 
-    board = Whiteboard.query.get(board_id)
     # Verifica se o usuário tem acesso à lousa
-    if not board or user not in board.accessible_by_users:
+    if context.board_id is None or not context.has_access:
         print(f"Usuário {user_email} sem acesso à lousa {board_id} ou lousa inexistente.")
         # Poderíamos emitir um erro de volta para o cliente aqui
         return
+    board_id = context.board_id
 
-    room = f"board_{board_id}"
-    join_room(room)
+    room = compression.join_board_rooms(request.sid, board_id, data.get('accept_encoding'))
+    presence.join(socketio, request.sid, board_id, context)
     print(f"Cliente {request.sid} (usuário {user_email}) entrou na sala {room}")
 
     try:
-        if board:
-            existing_strokes_data = []
-            for stroke_model in board.strokes:
-                existing_strokes_data.append({
-                    'id': stroke_model.id,
-                    'user_id': stroke_model.user_id,
-                    'color': stroke_model.color,
-                    'lineWidth': stroke_model.line_width,
-                    'points': json.loads(stroke_model.points_json)
-                })
-            emit('initial_drawing', {'strokes': existing_strokes_data})
-        else:
-            # Este caso não deve acontecer por causa da verificação acima, mas por segurança...
-            print(f"Lousa {board_id} não encontrada. Enviando desenho inicial vazio.")
-            emit('initial_drawing', {'strokes': []})
+        # Lousa arquivada volta para a tabela de traços; a réplica pode ainda não ter visto isso,
+        # nem o que a fez ser conferida no primário
+        rehydrated = context.archived and rehydrate_board(board_id)
+        execute = db.session.execute if rehydrated or from_primary else read_execute
+        text = reads.initial_drawing_json(execute, board_id, context.owner_is_guest, lod_level)
+        compression.emit_json_to_client(socketio, 'initial_drawing', text, request.sid)
 
     except Exception as e:
         print(f"Erro ao buscar/enviar dados iniciais do desenho para a lousa {board_id}: {e}")
@@ -195,10 +300,16 @@ def handle_join_board(data):
 
 
 @socketio.on('disconnect')
+@profiling.trace_event('disconnect')
 def handle_disconnect():
     """Chamado quando um cliente se desconecta."""
     sid = request.sid
     print(f"Cliente {sid} desconectado")
+    compression.forget_client(sid)
+    presence.leave(socketio, sid)
+
+    if sid in active_replays:
+        active_replays[sid]['cancelled'] = True
 
     # Se o SID pertencer a um convidado, remove apenas o usuário, mantendo seus dados.
     if sid in guest_sids:
@@ -212,6 +323,7 @@ def handle_disconnect():
                 # 2. Desassociar o usuário de lousas compartilhadas (não as que ele possui)
                 # Isso remove as entradas da tabela de associação `whiteboard_access`.
                 user_to_delete.accessible_whiteboards.clear()
+                bump_boards_version([user_to_delete.id])
 
                 # 3. Anular a propriedade das lousas que ele criou.
                 # Em vez de deletar a lousa, apenas definimos o owner_id como NULL ou para um admin.
@@ -239,6 +351,7 @@ def handle_disconnect():
 
 
 @socketio.on('draw_stroke_event')
+@profiling.trace_event('draw_stroke_event')
 def handle_draw_stroke_event(data):
     """Recebe um traço completo do cliente e o retransmite para outros na mesma sala."""
     board_id = data.get('board_id')
@@ -249,6 +362,9 @@ def handle_draw_stroke_event(data):
         print("Evento de desenho recebido com dados incompletos. Ignorando.")
         return
 
+    if compression.event_too_large('draw_stroke_event', data):
+        return
+
     user = User.query.filter_by(email=user_email).first()
     if not user:
         print(f"Usuário {user_email} não encontrado ao tentar desenhar.")
@@ -258,20 +374,29 @@ def handle_draw_stroke_event(data):
     if user.id in redo_stacks:
         redo_stacks[user.id] = []
 
+    presence.touch(socketio, request.sid, active=True)
     print(f"Evento de desenho recebido do usuário {user.name} para a lousa {board_id}")
     
     try:
+        # Lousa arquivada volta para a tabela de traços antes de receber outro
+        rehydrate_board(board_id)
+        with profiling.phase('serialization'):
+            points_json = json.dumps(data['points'], separators=(',', ':'))
+            lod_json = lod.dumps_lods(data['points'])
         new_stroke = Stroke(
             whiteboard_id=board_id,
             user_id=user.id,
             color=data['color'],
             line_width=data['lineWidth'],
-            points_json=json.dumps(data['points'])
+            points_json=points_json,
+            lod_json=lod_json
         )
         db.session.add(new_stroke)
+        db.session.flush()
+        record_board_event(board_id, 'add', stroke=new_stroke)
         db.session.commit()
+        maybe_checkpoint_board(board_id)
 
-        room = f"board_{board_id}"
         payload = {
             'id': new_stroke.id,
             'user_id': new_stroke.user_id,
@@ -282,50 +407,71 @@ def handle_draw_stroke_event(data):
             'temp_id': temp_id 
         }
         
-        # O `include_self=False` garante que o stroke não seja enviado de volta ao autor.
-        # O cliente que desenhou já tem o traço localmente.
-        emit('stroke_received', payload, room=room, include_self=True)
+        # Vai para todos, inclusive o autor, que troca o traço temporário (temp_id) pelo definitivo.
+        compression.emit_to_board(socketio, 'stroke_received', payload, board_id)
 
     except Exception as e:
         db.session.rollback()
         print(f"Erro ao salvar o traço no banco de dados para a lousa {board_id}: {e}")
 
 @socketio.on('cursor_move')
+@profiling.trace_event('cursor_move')
 def handle_cursor_move(data):
     """Recebe a posição do cursor e retransmite para outros na mesma sala."""
     board_id = data.get('board_id')
-    user_email = data.get('user_email')
     position = data.get('position')
 
-    if not all([board_id, user_email, position]):
+    if not all([board_id, position]):
         return
 
-    user = User.query.filter_by(email=user_email).first()
-    if not user:
+    if compression.event_too_large('cursor_move', data):
+        return
+
+    # Quem enviou vem do registro de presença, sem consulta ao banco a cada movimento
+    session = presence.touch(socketio, request.sid, active=True)
+    if session is None or session['board_id'] != board_id:
+        return
+
+    try:
+        payload = {
+            'board_id': session['board_id'],
+            'i': session['entry']['i'],
+            'x': round(float(position['x']), 1),
+            'y': round(float(position['y']), 1),
+        }
+    except (TypeError, KeyError, ValueError):
         return
 
     room = f"board_{board_id}"
-    
-    payload = {
-        'user_id': user.id,
-        'user_name': user.name,
-        'position': position
-    }
-    
-    emit('cursor_update', payload, room=room, include_self=False)
+    with profiling.phase('emit'):
+        emit('cursor_update', payload, room=room, include_self=False)
+
+@socketio.on('presence_heartbeat')
+@profiling.trace_event('presence_heartbeat')
+def handle_presence_heartbeat(data=None):
+    """Mantém a conexão na lista de presença da lousa (ver presence.py)."""
+    presence.touch(socketio, request.sid, active=False)
 
 @socketio.on('drawing_in_progress')
+@profiling.trace_event('drawing_in_progress')
 def handle_drawing_in_progress(data):
     """Recebe um traço em andamento e o retransmite para a sala."""
     board_id = data.get('board_id')
     if not board_id:
         return
+
+    if compression.event_too_large('drawing_in_progress', data):
+        return
+
+    presence.touch(socketio, request.sid, active=True)
     
     room = f"board_{board_id}"
     # Retransmite os dados do traço em andamento para todos na sala, exceto o remetente.
-    emit('drawing_in_progress', data, room=room, include_self=False)
+    with profiling.phase('emit'):
+        emit('drawing_in_progress', data, room=room, include_self=False)
 
 @socketio.on('undo_request')
+@profiling.trace_event('undo_request')
 def handle_undo(data):
     """Desfaz o último traço de um usuário em uma lousa."""
     user_email = data.get('user_email')
@@ -334,7 +480,8 @@ def handle_undo(data):
 
     if not user:
         return
-        
+
+    rehydrate_board(board_id)
     last_stroke = Stroke.query.filter_by(user_id=user.id, whiteboard_id=board_id).order_by(Stroke.created_at.desc()).first()
 
     if last_stroke:
@@ -344,6 +491,7 @@ def handle_undo(data):
             'color': last_stroke.color,
             'line_width': last_stroke.line_width,
             'points_json': last_stroke.points_json,
+            'lod_json': last_stroke.lod_json,
             'created_at': last_stroke.created_at
         }
         
@@ -352,14 +500,17 @@ def handle_undo(data):
         redo_stacks[user.id].append(stroke_data_for_redo)
 
         stroke_id_to_remove = last_stroke.id
+        record_board_event(last_stroke.whiteboard_id, 'remove', stroke_id=stroke_id_to_remove, user_id=user.id)
         db.session.delete(last_stroke)
         db.session.commit()
+        maybe_checkpoint_board(last_stroke.whiteboard_id)
         
         room = f"board_{board_id}"
         socketio.emit('stroke_removed', {'stroke_id': stroke_id_to_remove, 'board_id': board_id}, to=room)
         print(f"Usuário {user.name} desfez o traço {stroke_id_to_remove}")
 
 @socketio.on('redo_request')
+@profiling.trace_event('redo_request')
 def handle_redo(data):
     """Refaz o último traço desfeito por um usuário."""
     user_email = data.get('user_email')
@@ -372,16 +523,21 @@ def handle_redo(data):
     stroke_to_redo_data = redo_stacks[user.id].pop()
     
     try:
+        rehydrate_board(stroke_to_redo_data['whiteboard_id'])
         restored_stroke = Stroke(
             user_id=stroke_to_redo_data['user_id'],
             whiteboard_id=stroke_to_redo_data['whiteboard_id'],
             color=stroke_to_redo_data['color'],
             line_width=stroke_to_redo_data['line_width'],
             points_json=stroke_to_redo_data['points_json'],
+            lod_json=stroke_to_redo_data['lod_json'],
             created_at=stroke_to_redo_data['created_at']
         )
         db.session.add(restored_stroke)
+        db.session.flush()
+        record_board_event(restored_stroke.whiteboard_id, 'add', stroke=restored_stroke)
         db.session.commit()
+        maybe_checkpoint_board(restored_stroke.whiteboard_id)
 
         stroke_data_for_broadcast = {
             'id': restored_stroke.id,
@@ -391,8 +547,7 @@ def handle_redo(data):
             'lineWidth': restored_stroke.line_width,
             'points': json.loads(restored_stroke.points_json)
         }
-        room = f"board_{board_id}"
-        socketio.emit('stroke_received', stroke_data_for_broadcast, to=room)
+        compression.emit_to_board(socketio, 'stroke_received', stroke_data_for_broadcast, board_id)
         print(f"Usuário {user.name} refez um traço, novo ID: {restored_stroke.id}")
     except Exception as e:
         db.session.rollback()
@@ -401,6 +556,7 @@ def handle_redo(data):
         print(f"Erro ao refazer traço: {e}")
 
 @socketio.on('erase_stroke')
+@profiling.trace_event('erase_stroke')
 def handle_erase_stroke(data):
     """Apaga um traço específico, geralmente acionado pela ferramenta de borracha."""
     stroke_id = data.get('stroke_id')
@@ -410,11 +566,14 @@ def handle_erase_stroke(data):
         print(f"Pedido para apagar traço com dados incompletos: {data}")
         return
 
+    rehydrate_board(board_id)
     stroke_to_delete = db.session.get(Stroke, stroke_id)
     
     if stroke_to_delete:
+        record_board_event(stroke_to_delete.whiteboard_id, 'remove', stroke_id=stroke_to_delete.id)
         db.session.delete(stroke_to_delete)
         db.session.commit()
+        maybe_checkpoint_board(stroke_to_delete.whiteboard_id)
         
         room = f"board_{board_id}"
         socketio.emit('stroke_removed', {'stroke_id': stroke_id, 'board_id': board_id}, to=room)
@@ -422,7 +581,67 @@ def handle_erase_stroke(data):
     else:
         print(f"Tentativa de apagar traço {stroke_id} que não foi encontrado.")
 
+def erase_along_path(data, path):
+    """Apaga, em uma transação, todos os traços que o caminho da borracha atravessa."""
+    board_id = data.get('board_id')
+    user_email = data.get('user_email')
+    if not board_id or not user_email or not path:
+        return
+
+    user = User.query.filter_by(email=user_email).first()
+    if not user or not has_board_access(user.id, board_id):
+        print(f"Usuário {user_email} sem acesso para apagar na lousa {board_id}.")
+        return
+
+    # A geometria da borracha vem da tabela de traços
+    rehydrate_board(board_id)
+    try:
+        radius = float(data.get('radius') or 0)
+        hit_ids = eraser.strokes_hit(board_id, path, radius)
+    except (TypeError, ValueError, KeyError) as e:
+        print(f"Caminho de borracha inválido para a lousa {board_id}: {e}")
+        return
+    if not hit_ids:
+        return
+
+    try:
+        ensure_history_baseline(board_id)
+        # A geometria pode estar à frente/atrás do banco; vale o que o DELETE de fato removeu
+        removed_ids = db.session.execute(
+            db.delete(Stroke).where(Stroke.whiteboard_id == board_id, Stroke.id.in_(hit_ids)).returning(Stroke.id)
+        ).scalars().all()
+        for stroke_id in removed_ids:
+            record_board_event(board_id, 'remove', stroke_id=stroke_id, user_id=user.id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao apagar traços da lousa {board_id}: {e}")
+        return
+    maybe_checkpoint_board(board_id)
+
+    if removed_ids:
+        eraser.eraser_stats['strokes_erased'] += len(removed_ids)
+        compression.emit_to_board(socketio, 'strokes_removed', {'stroke_ids': sorted(removed_ids), 'board_id': board_id}, board_id)
+        print(f"Borracha de {user.name} apagou {len(removed_ids)} traços da lousa {board_id}")
+
+@socketio.on('erase_at')
+@profiling.trace_event('erase_at')
+def handle_erase_at(data):
+    """Borracha em um ponto: apaga os traços a até `radius` de (x, y)."""
+    if 'x' not in data or 'y' not in data:
+        return
+    erase_along_path(data, [{'x': data['x'], 'y': data['y']}])
+
+@socketio.on('erase_path')
+@profiling.trace_event('erase_path')
+def handle_erase_path(data):
+    """Borracha arrastada: apaga os traços a até `radius` da polilinha `points`."""
+    if compression.event_too_large('erase_path', data):
+        return
+    erase_along_path(data, data.get('points'))
+
 @socketio.on('clear_canvas_event')
+@profiling.trace_event('clear_canvas_event')
 def handle_clear_canvas_event(data):
     """Recebe um evento para limpar o canvas de uma lousa específica e retransmite."""
     board_id = data.get('board_id')
@@ -435,10 +654,13 @@ def handle_clear_canvas_event(data):
     emit('canvas_cleared', { 'board_id': board_id }, room=room, include_self=False) # Avisa outros clientes
 
     try:
+        rehydrate_board(board_id)
         board = db.session.get(Whiteboard, board_id)
         if board:
+            record_board_event(board.id, 'clear')
             Stroke.query.filter_by(whiteboard_id=board.id).delete()
             db.session.commit()
+            maybe_checkpoint_board(board.id)
             print(f"Traços da lousa {board.id} removidos do banco de dados.")
         else:
             print(f"Lousa {board_id} não encontrada para limpar traços.")
@@ -446,29 +668,142 @@ def handle_clear_canvas_event(data):
         db.session.rollback()
         print(f"Erro ao limpar traços do banco de dados: {e}")
 
+@socketio.on('replay_board')
+@profiling.trace_event('replay_board')
+def handle_replay_board(data):
+    """Inicia o replay do histórico de uma lousa para quem pediu."""
+    board_id = data.get('board_id')
+    user_email = data.get('user_email')
+    if not board_id or not user_email:
+        return
+
+    user = read_execute(db.select(User).filter_by(email=user_email)).scalar()
+    if not user or not has_board_access(user.id, board_id):
+        print(f"Usuário {user_email} sem acesso ao histórico da lousa {board_id}.")
+        return
+
+    try:
+        start = parse_history_timestamp(data.get('from'))
+        end = parse_history_timestamp(data.get('to'))
+        speed = min(max(float(data.get('speed') or 1.0), 0.1), 100.0)
+    except (TypeError, ValueError):
+        print(f"Parâmetros de replay inválidos: {data}")
+        return
+
+    sid = request.sid
+    if sid in active_replays:
+        active_replays[sid]['cancelled'] = True
+    active_replays[sid] = {'cancelled': False}
+    socketio.start_background_task(stream_board_replay, current_app._get_current_object(), sid, board_id, start, end, speed)
+
+@socketio.on('stop_replay')
+@profiling.trace_event('stop_replay')
+def handle_stop_replay(data=None):
+    """Interrompe o replay em andamento deste cliente."""
+    if request.sid in active_replays:
+        active_replays[request.sid]['cancelled'] = True
+
+# Administração do profiler (desligada sem PROFILER_ADMIN_TOKEN)
+@bp.route('/api/admin/profiler', methods=['GET', 'POST'])
+def profiler_admin():
+    if not profiling.PROFILER_ADMIN_TOKEN:
+        return jsonify({"message": "Profiler desativado: defina PROFILER_ADMIN_TOKEN."}), 404
+    if not profiling.admin_token_valid(request.headers.get('X-Admin-Token')):
+        return jsonify({"message": "Token de administração inválido"}), 403
+
+    if request.method == 'GET':
+        if request.args.get('format') == 'folded':
+            return profiling.folded_stacks(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+        return jsonify(profiler=profiling.profiler_state, slow_event_threshold_ms=profiling.SLOW_EVENT_THRESHOLD_MS,
+                       slow_events=list(profiling.slow_events))
+
+    data = request.get_json() or {}
+    action = data.get('action')
+    if action == 'start':
+        try:
+            interval_ms = profiling.profiler_interval_ms(data.get('interval_ms'))
+            seconds = float(data['seconds']) if data.get('seconds') is not None else None
+        except (TypeError, ValueError):
+            return jsonify({"message": "interval_ms e seconds devem ser números."}), 400
+        if seconds is not None and not (math.isfinite(seconds) and seconds >= 0):
+            return jsonify({"message": "seconds deve ser um número finito e não negativo."}), 400
+        if not profiling.start_profiler(interval_ms):
+            return jsonify({"message": "O profiler já está rodando."}), 409
+        if seconds:
+            socketio.start_background_task(_stop_profiler_after, seconds, profiling.profiler_state['started_at'])
+        print(f"Profiler ligado (amostra a cada {profiling.profiler_state['interval_ms']} ms).")
+        return jsonify(profiler=profiling.profiler_state)
+    if action == 'stop':
+        path = profiling.stop_profiler()
+        if not path:
+            return jsonify({"message": "O profiler não está rodando."}), 409
+        print(f"Profiler desligado; {profiling.profiler_state['samples']} amostras gravadas em {path}.")
+        return jsonify(profiler=profiling.profiler_state)
+    return jsonify({"message": "Ação deve ser 'start' ou 'stop'."}), 400
+
+def _stop_profiler_after(seconds, started_at):
+    socketio.sleep(seconds)
+    # Só desliga se ainda for a mesma sessão de profiling
+    if profiling.profiler_state['started_at'] == started_at:
+        path = profiling.stop_profiler()
+        if path:
+            print(f"Profiler desligado após {seconds}s; {profiling.profiler_state['samples']} amostras gravadas em {path}.")
+
 # API para Lousas
-@app.route('/api/whiteboards', methods=['GET'])
+@bp.route('/api/whiteboards', methods=['GET'])
 def get_whiteboards():
     user_email = request.args.get('email')
     if not user_email:
         return jsonify({"message": "Parâmetro 'email' é obrigatório"}), 400
 
-    user = User.query.filter_by(email=user_email).first()
+    # A versão vem sempre do primário (uma linha pelo índice do email): lida da réplica,
+    # poderia ser anterior a um create/share recém-feito e o cache guardaria a lista velha
+    user = db.session.execute(
+        db.select(User.id, User.boards_version, User.boards_updated_at, User.created_at).filter_by(email=user_email)
+    ).first()
     if not user:
         return jsonify({"message": "Usuário não encontrado"}), 404
 
-    boards = user.accessible_whiteboards.order_by(Whiteboard.created_at.asc()).all()
-    
-    boards_data = [{
-        'id': board.id,
-        'nickname': board.nickname,
-        'owner_id': board.owner_id,
-        'is_owner': board.owner_id == user.id
-    } for board in boards]
-
-    return jsonify(boards_data)
-
-@app.route('/api/whiteboards', methods=['POST'])
+    # A versão da lista decide tudo: 304, JSON do cache ou a consulta completa
+    etag = board_list_cache.etag_for(user.id, user.boards_version, user.boards_updated_at)
+    if board_list_cache.is_not_modified(etag, user.boards_updated_at):
+        board_list_cache.cache_stats['not_modified'] += 1
+        response = current_app.response_class(status=304)
+    else:
+        body = board_list_cache.get(user.id, user.boards_version)
+        if body is None:
+            # Lista alterada há pouco pode ainda não ter chegado à réplica
+            changed_at = user.boards_updated_at or user.created_at
+            recently_changed = changed_at and (
+                datetime.datetime.utcnow() - changed_at
+            ).total_seconds() < REPLICA_MAX_LAG_SECONDS
+            execute = db.session.execute if recently_changed else read_execute
+            boards = execute(
+                db.select(Whiteboard)
+                .join(whiteboard_access, whiteboard_access.c.whiteboard_id == Whiteboard.id)
+                .where(whiteboard_access.c.user_id == user.id)
+                .order_by(Whiteboard.created_at.asc())
+            ).scalars().all()
+
+            boards_data = [{
+                'id': board.id,
+                'nickname': board.nickname,
+                'owner_id': board.owner_id,
+                'is_owner': board.owner_id == user.id
+            } for board in boards]
+            body = current_app.json.dumps(boards_data)
+            board_list_cache.put(user.id, user.boards_version, body)
+        response = current_app.response_class(body, mimetype='application/json')
+
+    response.set_etag(etag)
+    if user.boards_updated_at:
+        response.last_modified = user.boards_updated_at.replace(tzinfo=datetime.timezone.utc)
+    # O navegador guarda a resposta, mas sempre revalida com o ETag antes de usá-la
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@bp.route('/api/whiteboards', methods=['POST'])
 def create_whiteboard():
     data = request.get_json()
     nickname = data.get('nickname')
@@ -490,6 +825,7 @@ def create_whiteboard():
         new_board.accessible_by_users.append(user)
         
         db.session.add(new_board)
+        bump_boards_version([user.id])
         db.session.commit()
 
         return jsonify({
@@ -506,7 +842,7 @@ def create_whiteboard():
         print(f"Erro ao criar lousa no banco de dados: {e}")
         return jsonify({"message": "Erro interno ao criar a lousa."}), 500
 
-@app.route('/api/whiteboards/<int:board_id>/share', methods=['POST'])
+@bp.route('/api/whiteboards/<int:board_id>/share', methods=['POST'])
 def share_whiteboard(board_id):
     """Compartilha uma lousa com outro usuário."""
     data = request.get_json()
@@ -537,6 +873,7 @@ def share_whiteboard(board_id):
 
     try:
         board.accessible_by_users.append(target_user)
+        bump_boards_version([target_user.id])
         db.session.commit()
         print(f"Lousa {board.id} compartilhada com sucesso com o usuário {target_user.name} (ID: {target_user.id})")
         return jsonify({"message": f"Lousa '{board.nickname}' compartilhada com {target_user.name}."})
@@ -545,7 +882,7 @@ def share_whiteboard(board_id):
         print(f"Erro ao compartilhar lousa: {e}")
         return jsonify({"message": "Erro interno ao compartilhar a lousa."}), 500
 
-@app.route('/api/whiteboards/<int:board_id>', methods=['DELETE'])
+@bp.route('/api/whiteboards/<int:board_id>', methods=['DELETE'])
 def delete_whiteboard(board_id):
     user_email = request.args.get('email')
     if not user_email:
@@ -565,13 +902,41 @@ def delete_whiteboard(board_id):
     if board.owner_id != user.id:
         return jsonify({"message": "Apenas o dono pode deletar a lousa"}), 403
 
-    db.session.delete(board)
-    db.session.commit()
+    nickname = board.nickname
+    try:
+        delete_whiteboard_rows(board_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao deletar a lousa {board_id}: {e}")
+        return jsonify({"message": "Erro interno ao deletar a lousa."}), 500
+    forget_board_history(board_id)
+    eraser.forget_board_geometry(board_id)
 
-    return jsonify({"message": f"Lousa '{board.nickname}' deletada com sucesso."})
+    return jsonify({"message": f"Lousa '{nickname}' deletada com sucesso."})
         
 
-@app.route('/api/auth/google', methods=['POST'])
+@bp.route('/api/whiteboards/<int:board_id>/history', methods=['GET'])
+def get_whiteboard_history(board_id):
+    """Traços da lousa como estavam no instante `at` (ISO 8601 ou epoch em ms)."""
+    user_email = request.args.get('email')
+    if not user_email:
+        return jsonify({"message": "Parâmetro 'email' é obrigatório"}), 400
+
+    try:
+        timestamp = parse_history_timestamp(request.args.get('at')) or datetime.datetime.utcnow()
+    except ValueError:
+        return jsonify({"message": "Parâmetro 'at' inválido"}), 400
+
+    user = read_execute(db.select(User).filter_by(email=user_email)).scalar()
+    if not user:
+        return jsonify({"message": "Usuário não encontrado"}), 404
+    if not has_board_access(user.id, board_id):
+        return jsonify({"message": "Sem acesso a esta lousa"}), 403
+
+    return jsonify({'board_id': board_id, 'at': timestamp.isoformat(), 'strokes': board_at(board_id, timestamp)})
+
+@bp.route('/api/auth/google', methods=['POST'])
 def google_auth():
     data = request.get_json()
     token = data.get('credential')
@@ -585,6 +950,10 @@ def google_auth():
         return jsonify({"message": "Server configuration error"}), 500
 
     try:
+        # Importado aqui: só este endpoint usa o google-auth, que é lento para carregar
+        from google.oauth2 import id_token
+        from google.auth.transport import requests
+
         # Verificar o token com o Google
         idinfo = id_token.verify_oauth2_token(token, requests.Request(), client_id)
 
@@ -622,6 +991,7 @@ def google_auth():
         # Esta verificação é importante para usuários existentes que podem não ter o acesso.
         if default_board not in user.accessible_whiteboards:
             user.accessible_whiteboards.append(default_board)
+            bump_boards_version([user.id])
         
         # 4. Commit de todas as alterações
             db.session.commit()
@@ -651,7 +1021,7 @@ def google_auth():
         db.session.rollback()
         return jsonify({"message": "An unexpected error occurred"}), 500
 
-@app.route('/api/auth/guest', methods=['POST'])
+@bp.route('/api/auth/guest', methods=['POST'])
 def guest_auth():
     """Cria um usuário convidado temporário."""
     try:
@@ -709,4 +1079,6 @@ def guest_auth():
 
 if __name__ == '__main__':
     print("Iniciando servidor Flask-SocketIO com Eventlet...")
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True, use_reloader=True)
\ No newline at end of file
+    app = create_app()
+    start_background_jobs(app)
+    socketio.run(app, host='0.0.0.0', port=5000, debug=True, use_reloader=True)
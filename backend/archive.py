@@ -0,0 +1,161 @@
+"""Arquivamento de lousas inativas em registros compactados e reidratação sob demanda."""
+import datetime
+import json
+import os
+import time
+import zlib
+
+import eraser
+import presence
+from extensions import db, socketio
+from models import BoardArchive, BoardEvent, Stroke, Whiteboard
+
+# Dias sem nenhuma atividade para uma lousa ser arquivada
+ARCHIVE_IDLE_DAYS = int(os.environ.get('ARCHIVE_IDLE_DAYS', '30'))
+# Intervalo do job de arquivamento em segundos (0 desativa; o comando `flask archive_boards` continua disponível)
+ARCHIVE_INTERVAL_SECONDS = int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '0'))
+# Colunas de `stroke` guardadas no arquivo, na ordem em que são serializadas
+ARCHIVED_STROKE_COLUMNS = ('id', 'user_id', 'whiteboard_id', 'color', 'line_width', 'points_json', 'lod_json', 'created_at')
+
+archive_stats = {
+    'boards_archived': 0,
+    'strokes_archived': 0,
+    'archive_seconds_total': 0.0,
+    'last_archive_seconds': None,
+    'boards_rehydrated': 0,
+    'rehydrate_seconds_total': 0.0,
+    'last_rehydrate_seconds': None,
+}
+
+def idle_board_ids(idle_days, limit=None):
+    """Lousas ainda não arquivadas cuja última atividade (traço, evento ou criação) é anterior ao corte."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=idle_days)
+    last_stroke = (
+        db.select(Stroke.whiteboard_id, db.func.max(Stroke.created_at).label('at'))
+        .group_by(Stroke.whiteboard_id).subquery()
+    )
+    last_event = (
+        db.select(BoardEvent.whiteboard_id, db.func.max(BoardEvent.created_at).label('at'))
+        .group_by(BoardEvent.whiteboard_id).subquery()
+    )
+    last_activity = db.func.coalesce(last_event.c.at, last_stroke.c.at, Whiteboard.created_at)
+    query = (
+        db.select(Whiteboard.id)
+        .outerjoin(last_stroke, last_stroke.c.whiteboard_id == Whiteboard.id)
+        .outerjoin(last_event, last_event.c.whiteboard_id == Whiteboard.id)
+        .outerjoin(BoardArchive, BoardArchive.whiteboard_id == Whiteboard.id)
+        .where(BoardArchive.whiteboard_id.is_(None), last_stroke.c.at.is_not(None), last_activity < cutoff)
+        .order_by(last_activity)
+    )
+    if limit:
+        query = query.limit(limit)
+    return db.session.execute(query).scalars().all()
+
+def board_room_is_active(board_id):
+    """Há clientes na sala da lousa, neste worker ou (pelo registro de presença) em outro?"""
+    if socketio.server.manager.rooms.get('/', {}).get(f"board_{board_id}"):
+        return True
+    return presence.board_has_participants(board_id)
+
+def archive_board(board_id):
+    """Compacta os traços da lousa em um BoardArchive e apaga as linhas de `stroke`, em uma transação.
+
+    Não gera eventos no histórico: para quem usa a lousa nada mudou.
+    """
+    started = time.perf_counter()
+    rows = db.session.execute(
+        db.select(*(getattr(Stroke, c) for c in ARCHIVED_STROKE_COLUMNS))
+        .filter_by(whiteboard_id=board_id).order_by(Stroke.id)
+    ).all()
+    if not rows:
+        return None
+
+    raw = json.dumps([
+        [row.id, row.user_id, row.whiteboard_id, row.color, row.line_width, row.points_json, row.lod_json,
+         row.created_at.isoformat() if row.created_at else None]
+        for row in rows
+    ]).encode('utf-8')
+    db.session.add(BoardArchive(
+        whiteboard_id=board_id,
+        strokes_blob=zlib.compress(raw, 6),
+        stroke_count=len(rows),
+        raw_bytes=len(raw)
+    ))
+    Stroke.query.filter_by(whiteboard_id=board_id).delete(synchronize_session=False)
+    db.session.commit()
+    eraser.forget_board_geometry(board_id)
+
+    elapsed = time.perf_counter() - started
+    archive_stats['boards_archived'] += 1
+    archive_stats['strokes_archived'] += len(rows)
+    archive_stats['archive_seconds_total'] += elapsed
+    archive_stats['last_archive_seconds'] = round(elapsed, 4)
+    return len(rows), elapsed
+
+def archive_idle_boards(idle_days=None, limit=None):
+    """Arquiva as lousas inativas, uma transação por lousa. Devolve quantas foram arquivadas."""
+    idle_days = ARCHIVE_IDLE_DAYS if idle_days is None else idle_days
+    archived = 0
+    for board_id in idle_board_ids(idle_days, limit):
+        if board_room_is_active(board_id):
+            continue
+        try:
+            result = archive_board(board_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Erro ao arquivar a lousa {board_id}: {e}")
+            continue
+        if result:
+            archived += 1
+            print(f"Lousa {board_id} arquivada: {result[0]} traços em {result[1] * 1000:.1f} ms.")
+    return archived
+
+def rehydrate_board(board_id):
+    """Se a lousa estiver arquivada, devolve seus traços para a tabela `stroke`.
+
+    Devolve True quando houve reidratação. O registro do arquivo é travado
+    (SELECT ... FOR UPDATE) para que duas entradas simultâneas não dupliquem os traços.
+    """
+    archive = db.session.execute(
+        db.select(BoardArchive).filter_by(whiteboard_id=board_id).with_for_update()
+    ).scalar()
+    if archive is None:
+        return False
+
+    started = time.perf_counter()
+    try:
+        rows = json.loads(zlib.decompress(archive.strokes_blob))
+        values = []
+        for row in rows:
+            value = dict(zip(ARCHIVED_STROKE_COLUMNS, row))
+            value['created_at'] = datetime.datetime.fromisoformat(value['created_at']) if value['created_at'] else None
+            values.append(value)
+        if values:
+            db.session.execute(db.insert(Stroke), values)
+        db.session.delete(archive)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # A geometria da borracha pode ter sido montada com a lousa ainda vazia
+    eraser.forget_board_geometry(board_id)
+
+    elapsed = time.perf_counter() - started
+    archive_stats['boards_rehydrated'] += 1
+    archive_stats['rehydrate_seconds_total'] += elapsed
+    archive_stats['last_rehydrate_seconds'] = round(elapsed, 4)
+    print(f"Lousa {board_id} reidratada: {len(values)} traços em {elapsed * 1000:.1f} ms.")
+    return True
+
+def archive_job_loop(app):
+    """Roda archive_idle_boards periodicamente em uma greenlet."""
+    while True:
+        socketio.sleep(ARCHIVE_INTERVAL_SECONDS)
+        with app.app_context():
+            try:
+                archive_idle_boards()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Erro no job de arquivamento: {e}")
+            finally:
+                db.session.remove()
@@ -0,0 +1,152 @@
+"""Compara o join_board antigo (ORM, várias consultas) com a camada de leitura em reads.py.
+
+Para cada tamanho, gera uma lousa sintética com dataset.generate_dataset e mede,
+sem o Socket.IO, o que o handler faz: autorização, leitura dos traços e o texto JSON
+do `initial_drawing` (a mesma serialização que o Socket.IO faria). Os dois caminhos
+são conferidos: precisam produzir o mesmo payload. Por padrão usa um SQLite temporário; com
+--database-url, use um banco descartável (as lousas geradas ficam lá).
+
+    python benchmarks/bench_join.py --sizes 10000,100000 --runs 5
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Consultas enviadas ao banco na rodada em andamento
+counter = {'queries': 0}
+
+
+def legacy_join(board_id, user_email, lod_level):
+    """O join_board como era antes de reads.py, sem os emits."""
+    import lod
+    from archive import rehydrate_board
+    from extensions import db
+    from models import Stroke, User, Whiteboard, has_board_access, read_execute
+    from retention import stroke_conditions
+
+    user = read_execute(db.select(User).filter_by(email=user_email)).scalar()
+    board = read_execute(db.select(Whiteboard).filter_by(id=board_id)).scalar()
+    assert user and board and has_board_access(user.id, board.id)
+    execute = db.session.execute if rehydrate_board(board.id) else read_execute
+    owner_is_guest = execute(db.select(User.is_guest).filter_by(id=board.owner_id)).scalar()
+    conditions, max_strokes = stroke_conditions(board.id, owner_is_guest)
+    query = db.select(Stroke).where(Stroke.whiteboard_id == board.id, *conditions)
+    if max_strokes:
+        strokes = execute(query.order_by(Stroke.id.desc()).limit(max_strokes)).scalars().all()[::-1]
+    else:
+        strokes = execute(query.order_by(Stroke.id)).scalars()
+    existing_strokes_data = []
+    for stroke_model in strokes:
+        existing_strokes_data.append({
+            'id': stroke_model.id,
+            'user_id': stroke_model.user_id,
+            'color': stroke_model.color,
+            'lineWidth': stroke_model.line_width,
+            'points': lod.points_for_level(stroke_model.points_json, stroke_model.lod_json, lod_level)
+        })
+    return json.dumps({
+        'strokes': existing_strokes_data,
+        'lod_level': lod_level,
+        'lod_max_scale': lod.max_scale_for_level(lod_level)
+    }, separators=(',', ':'))
+
+
+def reads_join(board_id, user_email, lod_level):
+    """O caminho atual do handler: uma consulta de contexto e a projeção dos traços."""
+    import reads
+    from archive import rehydrate_board
+    from extensions import db
+    from models import read_execute
+
+    context, from_primary = reads.join_context(board_id, user_email)
+    assert context and context.board_id is not None and context.has_access
+    rehydrated = context.archived and rehydrate_board(context.board_id)
+    execute = db.session.execute if rehydrated or from_primary else read_execute
+    return reads.initial_drawing_json(execute, context.board_id, context.owner_is_guest, lod_level)
+
+
+def measure(join, board_id, user_email, lod_level, runs):
+    from extensions import db
+
+    timings = []
+    queries = 0
+    for _ in range(runs):
+        db.session.remove()
+        counter['queries'] = 0
+        started = time.perf_counter()
+        text = join(board_id, user_email, lod_level)
+        timings.append(time.perf_counter() - started)
+        queries = counter['queries']
+    return timings, queries, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000', help='Traços por lousa, separados por vírgula.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--median-points', type=int, default=60)
+    parser.add_argument('--scale', type=float, default=None, help='Escala do viewport (ativa o LOD).')
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(tmp.name, "bench.db")}'
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+    sys.path.insert(0, BACKEND_DIR)
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    import lod
+    from app import create_app
+    from dataset import generate_dataset
+    from extensions import db
+    from models import User, Whiteboard, whiteboard_access
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def count_query(*_):
+        counter['queries'] += 1
+
+    app = create_app()
+    lod_level = lod.level_for_scale(args.scale)
+    with app.app_context():
+        db.create_all()
+        for i, size in enumerate(int(s) for s in args.sizes.split(',')):
+            started = time.perf_counter()
+            # Uma única lousa com exatamente `size` traços, além da principal (vazia)
+            generate_dataset(
+                args.seed * 1000 + i, users=50, boards=1, strokes_min=size, strokes_max=size,
+                default_board_strokes=0, guest_ratio=0, median_points=args.median_points,
+                end_date=datetime.datetime(2025, 1, 1),
+            )
+            board_id = db.session.execute(db.select(db.func.max(Whiteboard.id))).scalar()
+            user_email = db.session.execute(
+                db.select(User.email).join(whiteboard_access, whiteboard_access.c.user_id == User.id)
+                .where(whiteboard_access.c.whiteboard_id == board_id)
+            ).scalars().first()
+            print(f"\nLousa {board_id}: {size} traços gerados em {time.perf_counter() - started:.1f} s "
+                  f"(LOD nível {lod_level}; mediana / mínimo de {args.runs} rodadas)")
+
+            results = {}
+            payloads = []
+            for name, join in (('antes (ORM)', legacy_join), ('reads.py', reads_join)):
+                timings, queries, text = measure(join, board_id, user_email, lod_level, args.runs)
+                results[name] = statistics.median(timings)
+                payloads.append(json.loads(text))
+                print(f"  {name:<12} {statistics.median(timings) * 1000:9.1f} / {min(timings) * 1000:9.1f} ms"
+                      f"  {queries} consultas, {len(text) / 1e6:.1f} MB")
+            assert payloads[0] == payloads[1], 'os dois caminhos geraram payloads diferentes'
+            print(f"  ganho        {results['antes (ORM)'] / results['reads.py']:9.2f}x")
+    tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Mede o tempo de inicialização de um worker: importação, create_app() e primeira requisição.
+
+Cada rodada é um processo Python novo, como um worker recém-criado pelo gunicorn.
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executado no processo filho; imprime os tempos em JSON na última linha
+WORKER_SCRIPT = r'''
+import json, sys, time
+t0 = time.perf_counter()
+from gevent import monkey
+monkey.patch_all()
+t1 = time.perf_counter()
+from app import create_app
+t2 = time.perf_counter()
+app = create_app()
+t3 = time.perf_counter()
+with app.app_context():
+    from extensions import db
+    db.create_all()
+t4 = time.perf_counter()
+response = app.test_client().get('/api/status')
+t5 = time.perf_counter()
+google_loaded = 'google.oauth2.id_token' in sys.modules
+print(json.dumps({
+    'gevent_patch': t1 - t0,
+    'import_app': t2 - t1,
+    'create_app': t3 - t2,
+    'first_request': t5 - t4,
+    'total': (t3 - t0) + (t5 - t4),
+    'status': response.status_code,
+    'google_auth_loaded': google_loaded,
+}))
+'''
+
+GOOGLE_IMPORT_SCRIPT = r'''
+import json, time
+t0 = time.perf_counter()
+from google.oauth2 import id_token
+from google.auth.transport import requests
+print(json.dumps({'google_auth_import': time.perf_counter() - t0}))
+'''
+
+
+def run_child(script, env):
+    output = subprocess.run(
+        [sys.executable, '-c', script], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.join(tmp, "bench.db")}')
+        env.pop('DATABASE_REPLICA_URL', None)
+
+        results = [run_child(WORKER_SCRIPT, env) for _ in range(args.runs)]
+        google = [run_child(GOOGLE_IMPORT_SCRIPT, env)['google_auth_import'] for _ in range(args.runs)]
+
+    print(f"{args.runs} rodadas (mediana / mínimo, em ms)")
+    for key in ('gevent_patch', 'import_app', 'create_app', 'first_request', 'total'):
+        values = [r[key] * 1000 for r in results]
+        print(f"  {key:<15} {statistics.median(values):8.1f} / {min(values):8.1f}")
+    print(f"  google-auth carregado na inicialização: {'sim' if results[0]['google_auth_loaded'] else 'não'}")
+    print(f"  custo evitado (import do google-auth): {statistics.median(google) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Cache em processo e validação condicional de GET /api/whiteboards.
+
+Cada usuário tem `boards_version`, incrementada (bump_boards_version) sempre que a
+lista de lousas dele muda. A versão vira o ETag da resposta, e o corpo JSON fica
+guardado aqui por (usuário, versão). Assim, uma consulta que não mudou custa só a
+leitura da versão: responde 304 se o cliente já tem o ETag, ou devolve o JSON do
+cache sem refazer a consulta das lousas.
+
+Com vários workers cada um tem seu cache, mas a versão vem sempre do banco, então
+um worker nunca serve uma lista que outro já alterou.
+"""
+import collections
+import datetime
+import hashlib
+import os
+
+from flask import request
+
+BOARD_LIST_CACHE_SIZE = int(os.environ.get('BOARD_LIST_CACHE_SIZE', '1024'))
+
+# user_id -> (versão, corpo JSON), do menos para o mais recente
+_entries = collections.OrderedDict()
+
+cache_stats = {
+    'hits': 0,
+    'misses': 0,
+    'not_modified': 0,
+    'invalidations': 0,
+}
+
+
+def etag_for(user_id, version, updated_at):
+    key = f"{user_id}:{version}:{updated_at.isoformat() if updated_at else ''}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+def is_not_modified(etag, last_modified):
+    """Verifica If-None-Match e, só na falta dele, If-Modified-Since."""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if last_modified and request.if_modified_since:
+        # Last-Modified tem resolução de segundos
+        return request.if_modified_since >= last_modified.replace(microsecond=0, tzinfo=datetime.timezone.utc)
+    return False
+
+
+def get(user_id, version):
+    entry = _entries.get(user_id)
+    if entry is None or entry[0] != version:
+        cache_stats['misses'] += 1
+        return None
+    _entries.move_to_end(user_id)
+    cache_stats['hits'] += 1
+    return entry[1]
+
+
+def put(user_id, version, body):
+    _entries[user_id] = (version, body)
+    _entries.move_to_end(user_id)
+    while len(_entries) > BOARD_LIST_CACHE_SIZE:
+        _entries.popitem(last=False)
+
+
+def invalidate(user_ids):
+    for user_id in user_ids:
+        if _entries.pop(user_id, None) is not None:
+            cache_stats['invalidations'] += 1
+
+
+def report():
+    return dict(cache_stats, entries=len(_entries))
@@ -0,0 +1,191 @@
+"""Compressão e limites de tamanho das mensagens Socket.IO.
+
+Há duas camadas:
+
+* Transporte: o simple-websocket já negocia permessage-deflate com navegadores que o
+  pedem, e o long-polling usa `http_compression` do Engine.IO (ver socketio_options).
+* Aplicação: clientes que enviam `accept_encoding: 'deflate'` no join_board recebem os
+  eventos grandes (acima de SOCKET_COMPRESSION_THRESHOLD) como um anexo binário zlib
+  `{'encoding': 'deflate', 'data': <bytes>}`. Isso vale também quando algum proxy no
+  caminho derruba a extensão do websocket, o que é comum em redes móveis.
+
+Payloads que já chegam serializados (o `initial_drawing`, montado a partir do JSON
+guardado no banco) vão para os demais clientes como `{'encoding': 'json', 'data': <texto>}`,
+sem decodificar o JSON só para o Socket.IO serializá-lo de novo.
+"""
+import json
+import os
+import zlib
+
+from flask_socketio import join_room, leave_room
+
+from profiling import phase
+
+# Tamanho mínimo (bytes do JSON) para um evento ser enviado comprimido
+COMPRESSION_THRESHOLD = int(os.environ.get('SOCKET_COMPRESSION_THRESHOLD', '16384'))
+COMPRESSION_LEVEL = int(os.environ.get('SOCKET_COMPRESSION_LEVEL', '6'))
+
+# Limite de tamanho, em bytes do JSON, dos eventos recebidos dos clientes
+DEFAULT_EVENT_SIZE_CAPS = {
+    'draw_stroke_event': 1024 * 1024,
+    'drawing_in_progress': 256 * 1024,
+    'cursor_move': 1024,
+    'erase_path': 64 * 1024,
+}
+
+
+def _event_size_caps_from_env():
+    """SOCKET_EVENT_SIZE_CAPS='evento=bytes,evento=bytes' sobrescreve os padrões."""
+    caps = dict(DEFAULT_EVENT_SIZE_CAPS)
+    for item in os.environ.get('SOCKET_EVENT_SIZE_CAPS', '').split(','):
+        if '=' in item:
+            event, limit = item.split('=', 1)
+            caps[event.strip()] = int(limit)
+    return caps
+
+
+EVENT_SIZE_CAPS = _event_size_caps_from_env()
+
+# Clientes (sid) que aceitam eventos comprimidos
+deflate_sids = set()
+# Lousa em que cada cliente (sid) está, para sair das salas dela ao trocar
+client_boards = {}
+# Bytes por evento: JSON original x o que de fato foi enviado
+payload_stats = {}
+
+
+def socketio_options():
+    """Opções do Engine.IO para o long-polling e o tamanho máximo de uma mensagem."""
+    return {
+        'http_compression': os.environ.get('SOCKET_HTTP_COMPRESSION', 'true').lower() in ('1', 'true', 'yes', 'on'),
+        'compression_threshold': int(os.environ.get('SOCKET_HTTP_COMPRESSION_THRESHOLD', '1024')),
+        'max_http_buffer_size': int(os.environ.get('SOCKET_MAX_MESSAGE_BYTES', str(2 * 1024 * 1024))),
+    }
+
+
+def _stats_for(event):
+    return payload_stats.setdefault(event, {
+        'messages': 0, 'compressed_messages': 0, 'raw_bytes': 0, 'wire_bytes': 0, 'rejected': 0,
+    })
+
+
+def _record(event, raw_bytes, wire_bytes, compressed, recipients=1):
+    stats = _stats_for(event)
+    stats['messages'] += recipients
+    stats['raw_bytes'] += raw_bytes * recipients
+    stats['wire_bytes'] += wire_bytes * recipients
+    if compressed:
+        stats['compressed_messages'] += recipients
+
+
+def report():
+    """Resumo para o /api/status, com a taxa de compressão por evento."""
+    summary = {}
+    for event, stats in payload_stats.items():
+        summary[event] = dict(stats, ratio=round(stats['wire_bytes'] / stats['raw_bytes'], 3) if stats['raw_bytes'] else None)
+    return summary
+
+
+def encode(event, payload, compress):
+    """Serializa uma vez e devolve (payload para o emit, bytes JSON, bytes enviados)."""
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    if compress and len(raw) >= COMPRESSION_THRESHOLD:
+        data = zlib.compress(raw, COMPRESSION_LEVEL)
+        return {'encoding': 'deflate', 'data': data}, len(raw), len(data)
+    return payload, len(raw), len(raw)
+
+
+def emit_to_client(socketio, event, payload, sid):
+    """Envia um evento para um único cliente, comprimido se ele aceitar."""
+    with phase('serialization'):
+        message, raw_bytes, wire_bytes = encode(event, payload, sid in deflate_sids)
+    _record(event, raw_bytes, wire_bytes, wire_bytes != raw_bytes)
+    with phase('emit'):
+        socketio.emit(event, message, to=sid)
+
+
+def emit_json_to_client(socketio, event, text, sid):
+    """Como emit_to_client, para um payload que já é texto JSON."""
+    with phase('serialization'):
+        raw = text.encode('utf-8')
+        if sid in deflate_sids and len(raw) >= COMPRESSION_THRESHOLD:
+            data = zlib.compress(raw, COMPRESSION_LEVEL)
+            message, wire_bytes = {'encoding': 'deflate', 'data': data}, len(data)
+        else:
+            message, wire_bytes = {'encoding': 'json', 'data': text}, len(raw)
+    _record(event, len(raw), wire_bytes, wire_bytes != len(raw))
+    with phase('emit'):
+        socketio.emit(event, message, to=sid)
+
+
+def emit_to_board(socketio, event, payload, board_id):
+    """Envia um evento para toda a sala da lousa, em uma versão para cada tipo de cliente.
+
+    Quem aceita compressão está em `board_{id}:deflate` e os demais em `board_{id}:plain`
+    (ver join_board_rooms), então o JSON é serializado e comprimido só uma vez por evento.
+    """
+    room = f"board_{board_id}"
+    with phase('serialization'):
+        compressed, raw_bytes, wire_bytes = encode(event, payload, True)
+    if wire_bytes == raw_bytes:
+        _record(event, raw_bytes, raw_bytes, False, _room_size(socketio, room))
+        with phase('emit'):
+            socketio.emit(event, payload, to=room)
+        return
+    _record(event, raw_bytes, wire_bytes, True, _room_size(socketio, f"{room}:deflate"))
+    _record(event, raw_bytes, raw_bytes, False, _room_size(socketio, f"{room}:plain"))
+    with phase('emit'):
+        socketio.emit(event, compressed, to=f"{room}:deflate")
+        socketio.emit(event, payload, to=f"{room}:plain")
+
+
+def _room_size(socketio, room):
+    return len(socketio.server.manager.rooms.get('/', {}).get(room, ()))
+
+
+def _leave_board_rooms(sid, board_id):
+    room = f"board_{board_id}"
+    for name in (room, f"{room}:deflate", f"{room}:plain"):
+        leave_room(name, sid=sid)
+
+
+def join_board_rooms(sid, board_id, accept_encoding):
+    """Entra na sala da lousa e na sub-sala correspondente à compressão aceita pelo cliente.
+
+    Quem troca de lousa sai das salas da anterior, para não continuar recebendo os
+    broadcasts dela.
+    """
+    previous = client_boards.get(sid)
+    if previous is not None and previous != board_id:
+        _leave_board_rooms(sid, previous)
+    client_boards[sid] = board_id
+
+    room = f"board_{board_id}"
+    if accept_encoding == 'deflate':
+        deflate_sids.add(sid)
+        leave_room(f"{room}:plain", sid=sid)
+        join_room(f"{room}:deflate", sid=sid)
+    else:
+        deflate_sids.discard(sid)
+        leave_room(f"{room}:deflate", sid=sid)
+        join_room(f"{room}:plain", sid=sid)
+    join_room(room, sid=sid)
+    return room
+
+
+def forget_client(sid):
+    deflate_sids.discard(sid)
+    client_boards.pop(sid, None)
+
+
+def event_too_large(event, data):
+    """Verifica o limite de tamanho de um evento recebido; conta e avisa quando passa dele."""
+    cap = EVENT_SIZE_CAPS.get(event)
+    if not cap:
+        return False
+    size = len(json.dumps(data, separators=(',', ':')))
+    if size <= cap:
+        return False
+    _stats_for(event)['rejected'] += 1
+    print(f"Evento '{event}' com {size} bytes excede o limite de {cap} bytes. Ignorando.")
+    return True
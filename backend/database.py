@@ -0,0 +1,104 @@
+"""Configuração dos engines do SQLAlchemy (pool, timeouts e réplica de leitura)."""
+import os
+
+# Chave do bind da réplica em SQLALCHEMY_BINDS / db.engines
+REPLICA_BIND_KEY = 'replica'
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def normalize_database_url(url):
+    """O Render/Heroku ainda entregam 'postgres://', que o SQLAlchemy 2 não aceita."""
+    if url and url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def engine_options_for(url):
+    """Monta as opções do engine a partir das variáveis de ambiente.
+
+    Com gevent, cada requisição/evento roda em uma greenlet e centenas delas podem
+    disputar o pool ao mesmo tempo. Os padrões abaixo são maiores que os do
+    SQLAlchemy (5 + 10) e com timeout curto, para que a fila de espera por conexão
+    falhe rápido em vez de acumular greenlets paradas.
+    """
+    options = {
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+    }
+
+    # SQLite em memória usa SingletonThreadPool, que não aceita overflow/timeout
+    if url and url.startswith('sqlite') and ':memory:' not in url:
+        options['pool_size'] = _env_int('DB_POOL_SIZE', 10)
+    elif url and not url.startswith('sqlite'):
+        options.update({
+            'pool_size': _env_int('DB_POOL_SIZE', 10),
+            'max_overflow': _env_int('DB_MAX_OVERFLOW', 20),
+            'pool_timeout': _env_int('DB_POOL_TIMEOUT', 5),
+            # LIFO deixa as conexões ociosas no fundo da fila, onde o servidor pode fechá-las
+            'pool_use_lifo': True,
+        })
+
+    statement_timeout_ms = _env_int('DB_STATEMENT_TIMEOUT_MS', 0)
+    if statement_timeout_ms and url and url.startswith('postgresql'):
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout_ms}'}
+
+    return options
+
+
+def configure_database(app, default_url):
+    """Aplica URI, opções de pool e, se houver DATABASE_REPLICA_URL, o bind da réplica."""
+    primary_url = normalize_database_url(os.environ.get('DATABASE_URL')) or default_url
+    app.config['SQLALCHEMY_DATABASE_URI'] = primary_url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options_for(primary_url)
+
+    replica_url = normalize_database_url(os.environ.get('DATABASE_REPLICA_URL'))
+    if replica_url:
+        app.config['SQLALCHEMY_BINDS'] = {
+            REPLICA_BIND_KEY: {'url': replica_url, **engine_options_for(replica_url)},
+        }
+    return primary_url, replica_url
+
+
+# Atraso máximo esperado da réplica: dados alterados há menos que isso são lidos do primário
+REPLICA_MAX_LAG_SECONDS = _env_int('DB_REPLICA_MAX_LAG_SECONDS', 10)
+
+
+def read_engine(db):
+    """Engine usado para leituras: a réplica quando configurada, senão o primário."""
+    return db.engines.get(REPLICA_BIND_KEY) or db.engine
+
+
+def replica_enabled(db):
+    return REPLICA_BIND_KEY in db.engines
+
+
+def pool_stats(engine):
+    """Resumo de utilização do pool de um engine, para o /api/status."""
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if not hasattr(pool, 'checkedout'):
+        return stats
+
+    size = pool.size()
+    checked_out = pool.checkedout()
+    max_overflow = max(getattr(pool, '_max_overflow', 0), 0)
+    stats.update({
+        'size': size,
+        'max_overflow': max_overflow,
+        'checked_in': pool.checkedin(),
+        'checked_out': checked_out,
+        'overflow': max(pool.overflow(), 0),
+        'utilization': round(checked_out / (size + max_overflow), 3) if size + max_overflow else None,
+    })
+    return stats
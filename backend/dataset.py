@@ -0,0 +1,198 @@
+"""Gerador de bases sintéticas com o formato da produção, para testes de carga e benchmarks.
+
+Tudo sai de um `random.Random(seed)`: a mesma semente (e a mesma `end_date`) gera
+exatamente os mesmos usuários, lousas, acessos e traços. As linhas vão direto para
+`users`, `whiteboards`, `whiteboard_access` e `stroke` com INSERTs em lote, sem
+passar pelo Socket.IO nem pelo histórico.
+
+O formato imita o uso real: a lousa principal (ID 1) com quase todos os usuários,
+lousas pessoais compartilhadas com poucas pessoas, número de traços por lousa em
+distribuição log-uniforme e traços como caminhadas suaves com quantidade de pontos
+log-normal (muitos traços curtos, alguns bem longos).
+"""
+import datetime
+import json
+import math
+import random
+import uuid
+
+from extensions import db
+from lod import dumps_lods
+from models import DEFAULT_BOARD_ID, Stroke, User, Whiteboard, whiteboard_access
+
+INSERT_BATCH_SIZE = 5000
+
+COLORS = ('#000000', '#000000', '#000000', '#e53935', '#1e88e5', '#43a047', '#fdd835', '#8e24aa')
+LINE_WIDTHS = (1, 2, 2, 3, 3, 5, 8)
+CANVAS_WIDTH = 3000
+CANVAS_HEIGHT = 2000
+
+
+def _log_uniform(rng, low, high):
+    if low >= high:
+        return low
+    return int(round(math.exp(rng.uniform(math.log(low), math.log(high)))))
+
+
+def _point_count(rng, median, max_points):
+    return max(2, min(max_points, int(rng.lognormvariate(math.log(median), 0.8))))
+
+
+def _stroke_points(rng, count):
+    """Caminhada com direção que varia aos poucos, como um traço feito à mão."""
+    x = rng.uniform(0, CANVAS_WIDTH)
+    y = rng.uniform(0, CANVAS_HEIGHT)
+    heading = rng.uniform(0, 2 * math.pi)
+    curvature = rng.gauss(0, 0.05)
+    step = rng.uniform(2, 6)
+    points = []
+    for _ in range(count):
+        points.append({'x': round(x, 1), 'y': round(y, 1)})
+        curvature = 0.9 * curvature + rng.gauss(0, 0.03)
+        heading += curvature
+        x = min(max(x + step * math.cos(heading), 0), CANVAS_WIDTH)
+        y = min(max(y + step * math.sin(heading), 0), CANVAS_HEIGHT)
+    return points
+
+
+def _insert(table, rows):
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.session.execute(db.insert(table), rows[start:start + INSERT_BATCH_SIZE])
+
+
+def _sync_whiteboard_sequence():
+    """A lousa principal é inserida com ID explícito, o que não avança a sequência do PostgreSQL."""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(db.text(
+            "SELECT setval(pg_get_serial_sequence('whiteboards', 'id'), (SELECT max(id) FROM whiteboards))"
+        ))
+
+
+def _check_arguments(users, boards, strokes_min, strokes_max, default_board_strokes,
+                     default_member_ratio, guest_ratio, median_points, max_points, days):
+    """Levanta ValueError antes de qualquer INSERT, em vez de falhar no meio da geração."""
+    if users < 1:
+        raise ValueError("É preciso pelo menos 1 usuário (--users).")
+    if boards < 0 or default_board_strokes < 0 or days < 0:
+        raise ValueError("--boards, --default-board-strokes e --days não podem ser negativos.")
+    if not 1 <= strokes_min <= strokes_max:
+        raise ValueError(f"Faixa de traços inválida: {strokes_min}:{strokes_max} (precisa de 1 <= MIN <= MAX).")
+    for name, ratio in (('--default-member-ratio', default_member_ratio), ('--guest-ratio', guest_ratio)):
+        if not 0 <= ratio <= 1:
+            raise ValueError(f"{name} deve estar entre 0 e 1, não {ratio}.")
+    if median_points < 1 or max_points < 2:
+        raise ValueError("--median-points deve ser pelo menos 1 e --max-points pelo menos 2.")
+
+
+def generate_dataset(seed, users, boards, strokes_min, strokes_max, default_board_strokes,
+                     default_member_ratio=0.95, guest_ratio=0.3, median_points=60, max_points=2000,
+                     days=180, end_date=None, with_lods=False):
+    """Gera e grava a base. Devolve um dicionário com as contagens inseridas."""
+    _check_arguments(users, boards, strokes_min, strokes_max, default_board_strokes,
+                     default_member_ratio, guest_ratio, median_points, max_points, days)
+    rng = random.Random(seed)
+    end = end_date or datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = end - datetime.timedelta(days=days)
+    span_seconds = (end - start).total_seconds()
+
+    def timestamp():
+        return start + datetime.timedelta(seconds=rng.uniform(0, span_seconds))
+
+    # --- Usuários ---
+    user_rows = []
+    for i in range(users):
+        created_at = timestamp()
+        if rng.random() < guest_ratio:
+            guest_id = f"guest_{uuid.UUID(int=rng.getrandbits(128), version=4)}"
+            user_rows.append({
+                'id': guest_id, 'name': f"Visitante {guest_id[6:10]}", 'email': f"{guest_id}@guest.local",
+                'profile_pic': 'https://www.gravatar.com/avatar/00000000000000000000000000000000?d=mp&f=y',
+                'created_at': created_at, 'is_guest': True,
+            })
+        else:
+            user_rows.append({
+                'id': f"synthetic-{seed}-{i}", 'name': f"Usuário {i}", 'email': f"user{i}.seed{seed}@synthetic.local",
+                'profile_pic': f"https://example.com/avatars/{i}.png",
+                'created_at': created_at, 'is_guest': False,
+            })
+    if db.session.execute(db.select(User.id).where(User.id.in_([row['id'] for row in user_rows[:100]]))).first():
+        raise ValueError(f"Já existe uma base gerada com a semente {seed}.")
+    _insert(User.__table__, user_rows)
+    user_ids = [row['id'] for row in user_rows]
+    print(f"{len(user_rows)} usuários inseridos.")
+
+    # --- Lousas (a principal só é criada se ainda não existir) ---
+    access_rows = []
+    members = {}
+    created = {DEFAULT_BOARD_ID: start}
+    if db.session.get(Whiteboard, DEFAULT_BOARD_ID) is None:
+        db.session.execute(db.insert(Whiteboard.__table__), [{
+            'id': DEFAULT_BOARD_ID, 'nickname': 'Lousa Principal', 'owner_id': user_ids[0], 'created_at': start,
+        }])
+        _sync_whiteboard_sequence()
+    default_members = [user_id for user_id in user_ids if rng.random() < default_member_ratio]
+    members[DEFAULT_BOARD_ID] = default_members or user_ids[:1]
+    access_rows.extend({'user_id': user_id, 'whiteboard_id': DEFAULT_BOARD_ID} for user_id in members[DEFAULT_BOARD_ID])
+
+    board_rows = []
+    for i in range(boards):
+        board_rows.append({'nickname': f"Lousa sintética {i}", 'owner_id': rng.choice(user_ids), 'created_at': timestamp()})
+    board_ids = []
+    if board_rows:
+        board_ids = db.session.execute(
+            db.insert(Whiteboard.__table__).returning(Whiteboard.__table__.c.id, sort_by_parameter_order=True),
+            board_rows,
+        ).scalars().all()
+    for board_id, row in zip(board_ids, board_rows):
+        created[board_id] = row['created_at']
+        # Poucos compartilhamentos por lousa, com cauda longa
+        shared = {row['owner_id']}
+        while rng.random() < 0.6 and len(shared) < len(user_ids):
+            shared.add(rng.choice(user_ids))
+        members[board_id] = sorted(shared)
+        access_rows.extend({'user_id': user_id, 'whiteboard_id': board_id} for user_id in members[board_id])
+    _insert(whiteboard_access, access_rows)
+    db.session.commit()
+    print(f"{len(board_rows)} lousas e {len(access_rows)} acessos inseridos.")
+
+    # --- Traços, lousa por lousa, com commit a cada lote ---
+    stroke_counts = [(DEFAULT_BOARD_ID, default_board_strokes)]
+    stroke_counts += [(board_id, _log_uniform(rng, strokes_min, strokes_max)) for board_id in board_ids]
+    total_strokes = 0
+    total_points = 0
+    for board_id, count in stroke_counts:
+        board_members = members[board_id]
+        # Traços em ordem cronológica, como chegariam pelo socket (o undo usa created_at)
+        board_span = (end - created[board_id]).total_seconds()
+        offsets = sorted(rng.uniform(0, board_span) for _ in range(count))
+        batch = []
+        for offset in offsets:
+            points = _stroke_points(rng, _point_count(rng, median_points, max_points))
+            total_points += len(points)
+            batch.append({
+                'whiteboard_id': board_id,
+                'user_id': rng.choice(board_members),
+                'color': rng.choice(COLORS),
+                'line_width': float(rng.choice(LINE_WIDTHS)),
+                'points_json': json.dumps(points, separators=(',', ':')),
+                'lod_json': dumps_lods(points) if with_lods else None,
+                'created_at': created[board_id] + datetime.timedelta(seconds=offset),
+            })
+            if len(batch) >= INSERT_BATCH_SIZE:
+                db.session.execute(db.insert(Stroke.__table__), batch)
+                db.session.commit()
+                total_strokes += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(db.insert(Stroke.__table__), batch)
+            db.session.commit()
+            total_strokes += len(batch)
+        print(f"Lousa {board_id}: {count} traços ({total_strokes} no total).")
+
+    return {
+        'users': len(user_rows),
+        'boards': len(board_rows),
+        'access': len(access_rows),
+        'strokes': total_strokes,
+        'points': total_points,
+    }
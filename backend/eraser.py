@@ -0,0 +1,296 @@
+"""Borracha no servidor: quais traços um caminho de borracha atravessa.
+
+Cada lousa usada com a borracha ganha uma geometria em memória: todos os segmentos
+dos traços (pontos originais) em arrays do numpy, ordenados por célula de uma grade
+uniforme. Segmentos maiores que uma célula são partidos em pedaços do tamanho da
+célula, para que um traço longo não alargue a busca de todos os outros. Um teste de
+borracha só olha as células em volta do caminho e calcula a distância
+segmento-segmento de forma vetorizada, então o custo depende do que está perto da
+borracha, não do tamanho da lousa.
+
+A geometria acompanha a lousa pelo histórico: guarda o id do último `BoardEvent` que
+já aplicou e, antes de cada teste, aplica os eventos mais novos (de qualquer worker).
+Se ficou muito para trás, é reconstruída do zero.
+
+O numpy só é importado quando a primeira geometria é montada, para não pesar na
+inicialização dos workers.
+"""
+import collections
+import json
+import math
+import os
+
+from extensions import db
+from models import BoardEvent, Stroke
+
+# Lado da célula da grade, em unidades do mundo
+ERASER_GRID_CELL = float(os.environ.get('ERASER_GRID_CELL', '64'))
+ERASER_MAX_RADIUS = float(os.environ.get('ERASER_MAX_RADIUS', '200'))
+# Lousas com geometria em memória por worker
+ERASER_CACHE_BOARDS = int(os.environ.get('ERASER_CACHE_BOARDS', '32'))
+# Acima disso, reconstruir sai mais barato que aplicar os eventos um a um
+ERASER_MAX_EVENT_CATCHUP = 2000
+# Segmentos novos ficam fora da grade até juntar este tanto (ou 1/4 dos indexados)
+_MIN_REINDEX_TAIL = 4096
+# Se o caminho cobre células demais, testa todos os segmentos de uma vez
+_MAX_QUERY_CELLS = 1024
+# Pedaços por segmento no máximo; os que ainda ficam maiores que uma célula (só com
+# coordenadas absurdas) vão para o fim do índice e entram em toda busca
+_MAX_SEGMENT_PIECES = 256
+_OVERSIZED_KEY = (1 << 63) - 1
+
+_CELL_OFFSET = 1 << 31
+
+_boards = collections.OrderedDict()
+
+# numpy, carregado por _load_numpy
+np = None
+
+eraser_stats = {
+    'queries': 0,
+    'strokes_erased': 0,
+    'geometry_builds': 0,
+}
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        import numpy as np
+
+
+def _cell_keys(cx, cy):
+    return (cx.astype(np.int64) << 32) + (cy.astype(np.int64) + _CELL_OFFSET)
+
+
+def _point_segment_dist_sq(px, py, ax, ay, bx, by):
+    """Distância² de pontos a segmentos, elemento a elemento (aceita broadcast)."""
+    dx = bx - ax
+    dy = by - ay
+    length_sq = dx * dx + dy * dy
+    t = np.where(length_sq > 0, ((px - ax) * dx + (py - ay) * dy) / np.where(length_sq > 0, length_sq, 1), 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    cx = ax + t * dx - px
+    cy = ay + t * dy - py
+    return cx * cx + cy * cy
+
+
+def _segments_intersect(ax, ay, bx, by, cx, cy, dx, dy):
+    def orientation(px, py, qx, qy, rx, ry):
+        return np.sign((qx - px) * (ry - py) - (qy - py) * (rx - px))
+    o1 = orientation(ax, ay, bx, by, cx, cy)
+    o2 = orientation(ax, ay, bx, by, dx, dy)
+    o3 = orientation(cx, cy, dx, dy, ax, ay)
+    o4 = orientation(cx, cy, dx, dy, bx, by)
+    # Casos colineares já dão distância 0 pelos testes de ponto-segmento
+    return (o1 * o2 < 0) & (o3 * o4 < 0)
+
+
+class BoardGeometry:
+    """Segmentos de todos os traços de uma lousa, com índice em grade."""
+
+    def __init__(self, board_id):
+        self.board_id = board_id
+        self.last_event_id = 0
+        self.stroke_ids = []
+        self.stroke_index = {}
+        self.alive = np.zeros(0, dtype=bool)
+        # Colunas: ax, ay, bx, by, alcance (meia espessura), índice do traço
+        self.segments = np.zeros((0, 6), dtype=np.float64)
+        self.indexed = 0
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.oversized_start = 0
+        self.max_reach = 0.0
+
+    def add_strokes(self, strokes):
+        """Acrescenta traços dados como (id, pontos, espessura), em um único vstack."""
+        blocks = []
+        for stroke_id, points, line_width in strokes:
+            # O SQLite reaproveita ids de traços apagados; a versão antiga morre
+            self.remove_stroke(stroke_id)
+            index = len(self.stroke_ids)
+            self.stroke_ids.append(stroke_id)
+            self.stroke_index[stroke_id] = index
+            if not points:
+                continue
+            xy = np.array([(p['x'], p['y']) for p in points], dtype=np.float64)
+            if len(xy) == 1:
+                xy = np.vstack([xy, xy])
+            block = np.empty((len(xy) - 1, 6), dtype=np.float64)
+            block[:, 0:2] = xy[:-1]
+            block[:, 2:4] = xy[1:]
+            block[:, 4] = (line_width or 0) / 2.0
+            block[:, 5] = index
+            blocks.append(block)
+
+        self.alive = np.concatenate([self.alive, np.ones(len(self.stroke_ids) - len(self.alive), dtype=bool)])
+        if not blocks:
+            return
+        added = self._split_long_segments(np.vstack(blocks))
+        self.segments = np.vstack([self.segments, added])
+        self.max_reach = max(self.max_reach, float(added[:, 4].max()))
+        if len(self.segments) - self.indexed > max(_MIN_REINDEX_TAIL, self.indexed // 4):
+            self.reindex()
+
+    def _split_long_segments(self, segments):
+        """Parte cada segmento em pedaços de no máximo ERASER_GRID_CELL (até _MAX_SEGMENT_PIECES).
+
+        Assim o ponto médio de cada pedaço, que define sua célula, fica a meia célula de
+        qualquer ponto dele, e a margem da busca não depende do maior segmento da lousa.
+        """
+        lengths = np.hypot(segments[:, 2] - segments[:, 0], segments[:, 3] - segments[:, 1])
+        lengths = np.where(np.isfinite(lengths), lengths, 0.0)
+        pieces = np.clip(np.ceil(lengths / ERASER_GRID_CELL), 1, _MAX_SEGMENT_PIECES).astype(np.int64)
+        if (pieces == 1).all():
+            return segments
+
+        split = np.repeat(segments, pieces, axis=0)
+        starts = np.repeat(np.cumsum(pieces) - pieces, pieces)
+        piece = np.arange(len(split)) - starts
+        total = np.repeat(pieces, pieces).astype(np.float64)
+        t0 = (piece / total)[:, None]
+        t1 = ((piece + 1) / total)[:, None]
+        a = split[:, 0:2].copy()
+        d = split[:, 2:4] - a
+        split[:, 0:2] = a + t0 * d
+        split[:, 2:4] = a + t1 * d
+        return split
+
+    def remove_stroke(self, stroke_id):
+        index = self.stroke_index.get(stroke_id)
+        if index is not None and index < len(self.alive):
+            self.alive[index] = False
+
+    def clear(self):
+        self.alive[:] = False
+
+    def reindex(self):
+        """Ordena os segmentos pela célula do ponto médio; os traços apagados saem aqui."""
+        if len(self.segments):
+            self.segments = self.segments[self.alive[self.segments[:, 5].astype(np.int64)]]
+        mid_x = (self.segments[:, 0] + self.segments[:, 2]) / 2.0
+        mid_y = (self.segments[:, 1] + self.segments[:, 3]) / 2.0
+        keys = _cell_keys(np.floor(mid_x / ERASER_GRID_CELL), np.floor(mid_y / ERASER_GRID_CELL))
+        lengths = np.hypot(self.segments[:, 2] - self.segments[:, 0], self.segments[:, 3] - self.segments[:, 1])
+        keys[~(lengths <= ERASER_GRID_CELL)] = _OVERSIZED_KEY
+        order = np.argsort(keys, kind='stable')
+        self.segments = self.segments[order]
+        self.keys = keys[order]
+        self.indexed = len(self.segments)
+        self.oversized_start = int(np.searchsorted(self.keys, _OVERSIZED_KEY, side='left'))
+
+    def _candidates(self, min_x, min_y, max_x, max_y):
+        cx0, cx1 = int(np.floor(min_x / ERASER_GRID_CELL)), int(np.floor(max_x / ERASER_GRID_CELL))
+        cy0, cy1 = int(np.floor(min_y / ERASER_GRID_CELL)), int(np.floor(max_y / ERASER_GRID_CELL))
+        tail = np.arange(self.oversized_start, len(self.segments))
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > _MAX_QUERY_CELLS:
+            return np.arange(len(self.segments))
+
+        ranges = [tail]
+        for cx in range(cx0, cx1 + 1):
+            # As células de uma coluna são contíguas na ordem das chaves
+            first = _cell_keys(np.array([cx]), np.array([cy0]))[0]
+            last = _cell_keys(np.array([cx]), np.array([cy1]))[0]
+            start = np.searchsorted(self.keys, first, side='left')
+            end = np.searchsorted(self.keys, last, side='right')
+            if end > start:
+                ranges.append(np.arange(start, end))
+        return np.concatenate(ranges)
+
+    def hit_test(self, path, radius):
+        """Ids dos traços vivos a até `radius` (mais a meia espessura) do caminho."""
+        if not len(self.segments) or not path:
+            return []
+        xy = np.array([(p['x'], p['y']) for p in path], dtype=np.float64)
+        if len(xy) == 1:
+            xy = np.vstack([xy, xy])
+
+        # Todo pedaço indexado está a meia célula do ponto médio que define sua célula
+        margin = radius + self.max_reach + ERASER_GRID_CELL / 2.0
+        hit = np.zeros(len(self.stroke_ids), dtype=bool)
+        for (ex0, ey0), (ex1, ey1) in zip(xy[:-1], xy[1:]):
+            candidates = self._candidates(
+                min(ex0, ex1) - margin, min(ey0, ey1) - margin, max(ex0, ex1) + margin, max(ey0, ey1) + margin
+            )
+            if not len(candidates):
+                continue
+            seg = self.segments[candidates]
+            owners = seg[:, 5].astype(np.int64)
+            pending = self.alive[owners] & ~hit[owners]
+            if not pending.any():
+                continue
+            seg, owners = seg[pending], owners[pending]
+            ax, ay, bx, by, reach = seg[:, 0], seg[:, 1], seg[:, 2], seg[:, 3], seg[:, 4]
+
+            dist_sq = np.minimum.reduce([
+                _point_segment_dist_sq(ex0, ey0, ax, ay, bx, by),
+                _point_segment_dist_sq(ex1, ey1, ax, ay, bx, by),
+                _point_segment_dist_sq(ax, ay, ex0, ey0, ex1, ey1),
+                _point_segment_dist_sq(bx, by, ex0, ey0, ex1, ey1),
+            ])
+            within = (dist_sq <= (radius + reach) ** 2) | _segments_intersect(ex0, ey0, ex1, ey1, ax, ay, bx, by)
+            hit[owners[within]] = True
+
+        return [self.stroke_ids[i] for i in np.flatnonzero(hit)]
+
+
+def _build(board_id):
+    _load_numpy()
+    geometry = BoardGeometry(board_id)
+    # O último evento é lido antes dos traços: o que vier depois será reaplicado, sem perda
+    geometry.last_event_id = db.session.execute(
+        db.select(db.func.max(BoardEvent.id)).where(BoardEvent.whiteboard_id == board_id)
+    ).scalar() or 0
+    rows = db.session.execute(
+        db.select(Stroke.id, Stroke.points_json, Stroke.line_width)
+        .where(Stroke.whiteboard_id == board_id).order_by(Stroke.id)
+    )
+    geometry.add_strokes((stroke_id, json.loads(points_json), line_width) for stroke_id, points_json, line_width in rows)
+    geometry.reindex()
+    eraser_stats['geometry_builds'] += 1
+    return geometry
+
+
+def _catch_up(geometry):
+    """Aplica os eventos do histórico posteriores ao que a geometria já viu."""
+    events = db.session.execute(
+        db.select(BoardEvent.id, BoardEvent.op, BoardEvent.stroke_id, BoardEvent.payload_json)
+        .where(BoardEvent.whiteboard_id == geometry.board_id, BoardEvent.id > geometry.last_event_id)
+        .order_by(BoardEvent.id).limit(ERASER_MAX_EVENT_CATCHUP + 1)
+    ).all()
+    if len(events) > ERASER_MAX_EVENT_CATCHUP:
+        return False
+    for event_id, op, stroke_id, payload_json in events:
+        if op == 'add' and payload_json:
+            payload = json.loads(payload_json)
+            geometry.add_strokes([(stroke_id, payload['points'], payload.get('lineWidth'))])
+        elif op == 'remove':
+            geometry.remove_stroke(stroke_id)
+        elif op == 'clear':
+            geometry.clear()
+        geometry.last_event_id = event_id
+    return True
+
+
+def board_geometry(board_id):
+    """Geometria atualizada da lousa, do cache quando possível."""
+    geometry = _boards.get(board_id)
+    if geometry is None or not _catch_up(geometry):
+        geometry = _build(board_id)
+        _boards[board_id] = geometry
+    _boards.move_to_end(board_id)
+    while len(_boards) > ERASER_CACHE_BOARDS:
+        _boards.popitem(last=False)
+    return geometry
+
+
+def forget_board_geometry(board_id):
+    _boards.pop(board_id, None)
+
+
+def strokes_hit(board_id, path, radius):
+    eraser_stats['queries'] += 1
+    radius = float(radius)
+    # Raio negativo viraria distância positiva em (radius + reach) ** 2
+    radius = min(max(radius, 0.0), ERASER_MAX_RADIUS) if math.isfinite(radius) else 0.0
+    return board_geometry(board_id).hit_test(path, radius)
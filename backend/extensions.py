@@ -0,0 +1,10 @@
+"""Extensões do Flask, criadas sem aplicação e ligadas a ela em create_app()."""
+from flask_cors import CORS
+from flask_migrate import Migrate
+from flask_socketio import SocketIO
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+migrate = Migrate()
+socketio = SocketIO()
+cors = CORS()
@@ -0,0 +1,14 @@
+"""Configuração do gunicorn, lida automaticamente quando ele roda a partir de backend/.
+
+    gunicorn -k gevent -w 1 wsgi:application
+
+Os jobs periódicos (presença, arquivamento, retenção) começam aqui, em cada worker
+já carregado. Importar o wsgi.py, como o `flask` faz para achar a aplicação nos
+comandos de CLI, não inicia nada.
+"""
+
+
+def post_worker_init(worker):
+    from app import start_background_jobs
+
+    start_background_jobs(worker.wsgi)
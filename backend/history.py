@@ -0,0 +1,306 @@
+"""Histórico append-only das lousas: eventos, checkpoints, `board_at` e replay.
+
+Os checkpoints guardam um traço por linha (`id<TAB>json do traço`), comprimidos com
+zlib. Montá-los e lê-los não decodifica os pontos: o JSON de cada traço passa adiante
+como texto, e só `board_at` o decodifica no fim. O trabalho é feito em blocos que
+devolvem a vez às outras greenlets, e os checkpoints periódicos são gravados em segundo
+plano, fora do handler que disparou o evento.
+"""
+import datetime
+import json
+import os
+import zlib
+
+from flask import current_app
+from gevent.lock import Semaphore
+
+from extensions import db, socketio
+from models import BoardCheckpoint, BoardEvent, Stroke, read_execute, stroke_to_dict
+
+# A cada quantos eventos de uma lousa um novo checkpoint é gravado
+HISTORY_CHECKPOINT_EVERY = int(os.environ.get('HISTORY_CHECKPOINT_EVERY', '500'))
+# Eventos buscados por vez durante um replay (o histórico nunca é carregado inteiro)
+HISTORY_REPLAY_BATCH = 500
+# Pausa máxima entre dois eventos no replay, para que períodos ociosos não travem a reprodução
+HISTORY_REPLAY_MAX_GAP = float(os.environ.get('HISTORY_REPLAY_MAX_GAP', '2.0'))
+
+# Traços lidos por consulta ao montar o checkpoint inicial, e por bloco ao comprimir
+HISTORY_BASELINE_BATCH = 2000
+# Bytes comprimidos descomprimidos por bloco ao ler um checkpoint
+_CHECKPOINT_READ_CHUNK = 256 * 1024
+
+# Lousas que já têm checkpoint inicial e eventos desde o último checkpoint, por worker
+boards_with_history = set()
+history_event_counts = {}
+# Checkpoint inicial em construção (uma greenlet por lousa) e checkpoints agendados
+_baseline_locks = {}
+pending_checkpoints = set()
+# Replays em andamento: { sid: {'cancelled': bool} }
+active_replays = {}
+
+def _table_lines(board_id):
+    """Linhas de checkpoint dos traços atuais da lousa, lidos em lotes pela chave (whiteboard_id, id)."""
+    dumps = json.dumps
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            db.select(Stroke.id, Stroke.user_id, Stroke.color, Stroke.line_width, Stroke.points_json, Stroke.created_at)
+            .where(Stroke.whiteboard_id == board_id, Stroke.id > last_id)
+            .order_by(Stroke.id).limit(HISTORY_BASELINE_BATCH)
+        ).all()
+        for stroke_id, user_id, color, line_width, points_json, created_at in rows:
+            yield (
+                f'{stroke_id}\t{{"id":{stroke_id},"user_id":{dumps(user_id)},"color":{dumps(color)},'
+                f'"lineWidth":{dumps(line_width)},"points":{points_json},'
+                f'"created_at":{dumps(created_at.isoformat() if created_at else None)}}}\n'
+            )
+        if len(rows) < HISTORY_BASELINE_BATCH:
+            return
+        last_id = rows[-1][0]
+        socketio.sleep(0)
+
+def _compress_lines(lines):
+    """Comprime as linhas de um checkpoint em blocos, devolvendo a vez às outras greenlets."""
+    compressor = zlib.compressobj(6)
+    parts = []
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= HISTORY_BASELINE_BATCH:
+            parts.append(compressor.compress(''.join(block).encode('utf-8')))
+            block = []
+            socketio.sleep(0)
+    parts.append(compressor.compress(''.join(block).encode('utf-8')))
+    parts.append(compressor.flush())
+    return b''.join(parts)
+
+def _checkpoint_state(checkpoint):
+    """Estado { stroke_id: JSON do traço } de um checkpoint, sem decodificar os traços."""
+    if checkpoint.strokes_blob is None:
+        # Checkpoints gravados antes da compressão: uma lista JSON
+        return {stroke['id']: json.dumps(stroke) for stroke in json.loads(checkpoint.strokes_json)}
+    state = {}
+    decompressor = zlib.decompressobj()
+    blob = checkpoint.strokes_blob
+    pending = b''
+    for start in range(0, len(blob), _CHECKPOINT_READ_CHUNK):
+        pending += decompressor.decompress(blob[start:start + _CHECKPOINT_READ_CHUNK])
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            stroke_id, text = line.split(b'\t', 1)
+            state[int(stroke_id)] = text.decode('utf-8')
+        socketio.sleep(0)
+    return state
+
+def _decode_state(state):
+    return json.loads('[' + ','.join(state.values()) + ']')
+
+def ensure_history_baseline(board_id):
+    """Grava o estado atual como checkpoint 0 na primeira mutação de uma lousa sem histórico.
+
+    Assim os traços salvos antes do histórico existir também entram no `board_at`.
+    Deve ser chamado antes da mutação, na mesma transação. Os traços são lidos em
+    lotes e, enquanto isso, outras mutações da mesma lousa neste worker esperam.
+    """
+    if board_id in boards_with_history:
+        return
+    lock = _baseline_locks.setdefault(board_id, Semaphore())
+    with lock:
+        if board_id in boards_with_history:
+            return
+        exists = db.session.execute(
+            db.select(BoardCheckpoint.id).filter_by(whiteboard_id=board_id).limit(1)
+        ).first()
+        if not exists:
+            db.session.add(BoardCheckpoint(
+                whiteboard_id=board_id, last_event_id=0, strokes_blob=_compress_lines(_table_lines(board_id))
+            ))
+        boards_with_history.add(board_id)
+    _baseline_locks.pop(board_id, None)
+
+def record_board_event(board_id, op, stroke=None, stroke_id=None, user_id=None):
+    """Adiciona um evento ao histórico na transação atual; o commit fica com quem chamou."""
+    ensure_history_baseline(board_id)
+    event = BoardEvent(
+        whiteboard_id=board_id,
+        op=op,
+        stroke_id=stroke.id if stroke is not None else stroke_id,
+        user_id=stroke.user_id if stroke is not None else user_id,
+        payload_json=json.dumps(stroke_to_dict(stroke)) if stroke is not None else None
+    )
+    db.session.add(event)
+    history_event_counts[board_id] = history_event_counts.get(board_id, 0) + 1
+    return event
+
+def maybe_checkpoint_board(board_id):
+    """Agenda um checkpoint em segundo plano se a lousa acumulou eventos suficientes. Chamar após o commit."""
+    if history_event_counts.get(board_id, 0) < HISTORY_CHECKPOINT_EVERY or board_id in pending_checkpoints:
+        return
+    history_event_counts[board_id] = 0
+    pending_checkpoints.add(board_id)
+    socketio.start_background_task(write_checkpoint, current_app._get_current_object(), board_id)
+
+def write_checkpoint(app, board_id):
+    """Grava o estado da lousa após o último evento, a partir do checkpoint anterior."""
+    with app.app_context():
+        try:
+            last_event = db.session.execute(
+                db.select(BoardEvent.id, BoardEvent.created_at)
+                .filter_by(whiteboard_id=board_id).order_by(BoardEvent.id.desc()).limit(1)
+            ).first()
+            if last_event is None:
+                return
+            state = _state_at(board_id, last_event.created_at, db.session.execute, until_event_id=last_event.id)
+            if state is None:
+                return
+            db.session.add(BoardCheckpoint(
+                whiteboard_id=board_id,
+                last_event_id=last_event.id,
+                strokes_blob=_compress_lines(f"{stroke_id}\t{text}\n" for stroke_id, text in state.items()),
+                created_at=last_event.created_at
+            ))
+            db.session.commit()
+            print(f"Checkpoint do histórico gravado para a lousa {board_id} (evento {last_event.id}).")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Erro ao gravar checkpoint do histórico da lousa {board_id}: {e}")
+        finally:
+            pending_checkpoints.discard(board_id)
+            db.session.remove()
+
+def forget_board_history(board_id):
+    """Descarta o estado em memória do histórico de uma lousa deletada."""
+    boards_with_history.discard(board_id)
+    history_event_counts.pop(board_id, None)
+
+def apply_board_event(state, event):
+    """Aplica um evento a um estado { stroke_id: JSON do traço } (mantém a ordem de inserção)."""
+    if event.op == 'add':
+        state[event.stroke_id] = event.payload_json
+    elif event.op == 'remove':
+        state.pop(event.stroke_id, None)
+    elif event.op == 'clear':
+        state.clear()
+
+def _state_at(board_id, timestamp, execute, until_event_id=None):
+    """Estado { stroke_id: JSON do traço } no instante, ou None se for anterior a todos os checkpoints."""
+    checkpoint = execute(
+        db.select(BoardCheckpoint)
+        .where(BoardCheckpoint.whiteboard_id == board_id, BoardCheckpoint.created_at <= timestamp)
+        .order_by(BoardCheckpoint.created_at.desc(), BoardCheckpoint.last_event_id.desc())
+        .limit(1)
+    ).scalar()
+    if checkpoint is None:
+        return None
+
+    state = _checkpoint_state(checkpoint)
+    last_id = checkpoint.last_event_id
+    while True:
+        conditions = [BoardEvent.whiteboard_id == board_id, BoardEvent.id > last_id, BoardEvent.created_at <= timestamp]
+        if until_event_id is not None:
+            conditions.append(BoardEvent.id <= until_event_id)
+        events = execute(
+            db.select(BoardEvent.id, BoardEvent.op, BoardEvent.stroke_id, BoardEvent.payload_json)
+            .where(*conditions).order_by(BoardEvent.id).limit(HISTORY_REPLAY_BATCH)
+        ).all()
+        for event in events:
+            apply_board_event(state, event)
+        if len(events) < HISTORY_REPLAY_BATCH:
+            break
+        last_id = events[-1].id
+    return state
+
+def board_at(board_id, timestamp, execute=read_execute, until_event_id=None):
+    """Reconstrói os traços de uma lousa no instante `timestamp` (UTC, sem fuso).
+
+    Parte do último checkpoint anterior ao instante e reaplica só os eventos
+    seguintes, buscados em lotes pelo índice (whiteboard_id, id).
+    """
+    state = _state_at(board_id, timestamp, execute, until_event_id)
+    if state is not None:
+        return _decode_state(state)
+
+    # Instante anterior a todos os checkpoints: usa o inicial, filtrando pela data dos traços
+    first = execute(
+        db.select(BoardCheckpoint).filter_by(whiteboard_id=board_id, last_event_id=0).limit(1)
+    ).scalar()
+    if first is None:
+        return []
+    iso = timestamp.isoformat()
+    return [s for s in _decode_state(_checkpoint_state(first)) if s.get('created_at') and s['created_at'] <= iso]
+
+def parse_history_timestamp(value):
+    """Aceita ISO 8601 (com ou sem fuso) ou epoch em milissegundos; devolve UTC sem fuso."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        try:
+            return datetime.datetime.utcfromtimestamp(int(value) / 1000)
+        except (OverflowError, OSError) as e:
+            # Epoch fora do intervalo de datas: para quem chama, é um valor inválido como outro qualquer
+            raise ValueError(f"Timestamp fora do intervalo: {value}") from e
+    parsed = datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def stream_board_replay(app, sid, board_id, start, end, speed):
+    """Envia os eventos do histórico para um único cliente, em ordem e no ritmo pedido.
+
+    Os eventos são lidos em lotes por id, e a sessão é devolvida ao pool entre os
+    lotes para que um replay longo não segure uma conexão do banco.
+    """
+    replay = active_replays[sid]
+    sent = 0
+    try:
+        with app.app_context():
+            initial = board_at(board_id, start) if start else []
+            last_id = 0
+            if start:
+                # Só os eventos posteriores ao instante inicial
+                boundary = read_execute(
+                    db.select(db.func.max(BoardEvent.id))
+                    .where(BoardEvent.whiteboard_id == board_id, BoardEvent.created_at <= start)
+                ).scalar()
+                last_id = boundary or 0
+            db.session.remove()
+            socketio.emit('replay_started', {'board_id': board_id, 'strokes': initial, 'speed': speed}, to=sid)
+
+            previous_at = start
+            while not replay['cancelled']:
+                conditions = [BoardEvent.whiteboard_id == board_id, BoardEvent.id > last_id]
+                if end:
+                    conditions.append(BoardEvent.created_at <= end)
+                events = read_execute(
+                    db.select(BoardEvent.id, BoardEvent.op, BoardEvent.stroke_id, BoardEvent.payload_json, BoardEvent.created_at)
+                    .where(*conditions).order_by(BoardEvent.id).limit(HISTORY_REPLAY_BATCH)
+                ).all()
+                db.session.remove()
+
+                for event in events:
+                    if replay['cancelled']:
+                        break
+                    if previous_at is not None:
+                        gap = (event.created_at - previous_at).total_seconds() / speed
+                        if gap > 0:
+                            socketio.sleep(min(gap, HISTORY_REPLAY_MAX_GAP))
+                    previous_at = event.created_at
+                    socketio.emit('replay_op', {
+                        'board_id': board_id,
+                        'op': event.op,
+                        'stroke_id': event.stroke_id,
+                        'stroke': json.loads(event.payload_json) if event.payload_json else None,
+                        'at': event.created_at.isoformat()
+                    }, to=sid)
+                    sent += 1
+
+                if len(events) < HISTORY_REPLAY_BATCH:
+                    break
+                last_id = events[-1].id
+    except Exception as e:
+        print(f"Erro durante o replay da lousa {board_id} para o cliente {sid}: {e}")
+    finally:
+        if active_replays.get(sid) is replay:
+            active_replays.pop(sid)
+        socketio.emit('replay_finished', {'board_id': board_id, 'events': sent, 'cancelled': replay['cancelled']}, to=sid)
+        print(f"Replay da lousa {board_id} para o cliente {sid} encerrado após {sent} eventos.")
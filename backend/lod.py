@@ -0,0 +1,121 @@
+"""Níveis de detalhe (LOD) da geometria dos traços.
+
+Cada traço é salvo com os pontos originais (nível 0) e com versões simplificadas
+pelo algoritmo Ramer-Douglas-Peucker, com tolerâncias crescentes em unidades do
+mundo. Ao entrar em uma lousa, o cliente informa a escala atual do viewport e
+recebe o nível mais grosseiro cujo erro ainda fica abaixo de ~1px na tela.
+"""
+import json
+import math
+import os
+
+# Tolerância (em unidades do mundo) dos níveis 1, 2, 3...; o nível 0 são os pontos originais
+LOD_TOLERANCES = tuple(
+    float(t) for t in os.environ.get('STROKE_LOD_TOLERANCES', '0.75,3,12').split(',') if t.strip()
+)
+# Erro máximo aceitável, em pixels de tela, ao escolher um nível para uma escala
+LOD_MAX_SCREEN_ERROR_PX = float(os.environ.get('STROKE_LOD_MAX_SCREEN_ERROR_PX', '1.0'))
+
+
+def _segment_distance_sq(px, py, ax, ay, bx, by):
+    dx = bx - ax
+    dy = by - ay
+    if dx == 0 and dy == 0:
+        return (px - ax) ** 2 + (py - ay) ** 2
+    t = ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)
+    t = max(0.0, min(1.0, t))
+    cx = ax + t * dx
+    cy = ay + t * dy
+    return (px - cx) ** 2 + (py - cy) ** 2
+
+
+def simplify(points, tolerance):
+    """Ramer-Douglas-Peucker iterativo (sem recursão, para traços longos)."""
+    n = len(points)
+    if n < 3:
+        return list(points)
+
+    xs = [p['x'] for p in points]
+    ys = [p['y'] for p in points]
+    tolerance_sq = tolerance * tolerance
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+
+    while stack:
+        start, end = stack.pop()
+        max_dist_sq = 0.0
+        index = start
+        ax, ay, bx, by = xs[start], ys[start], xs[end], ys[end]
+        for i in range(start + 1, end):
+            d = _segment_distance_sq(xs[i], ys[i], ax, ay, bx, by)
+            if d > max_dist_sq:
+                index = i
+                max_dist_sq = d
+        if max_dist_sq > tolerance_sq:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return [p for p, k in zip(points, keep) if k]
+
+
+def build_lods(points):
+    """Gera a pirâmide de níveis para um traço, pronta para salvar em `Stroke.lod_json`.
+
+    Cada nível é simplificado a partir dos pontos originais, então seu erro é a
+    própria tolerância (simplificar a partir do nível anterior somaria os erros).
+    Níveis que não reduzem o número de pontos são gravados como None e caem para o
+    nível mais fino.
+    """
+    levels = []
+    finest = len(points)
+    for tolerance in LOD_TOLERANCES:
+        simplified = simplify(points, tolerance)
+        if len(simplified) < finest:
+            levels.append(simplified)
+            finest = len(simplified)
+        else:
+            levels.append(None)
+    return levels
+
+
+def dumps_lods(points):
+    levels = build_lods(points)
+    # Traços curtos costumam não ter nenhum nível útil; não ocupa espaço à toa
+    return json.dumps(levels) if any(level is not None for level in levels) else None
+
+
+def level_for_scale(scale):
+    """Nível mais grosseiro cujo erro, na escala dada, fica dentro do limite em pixels.
+
+    A escala vem do cliente: valores inválidos caem para o nível 0 (todos os pontos).
+    """
+    try:
+        scale = float(scale)
+    except (TypeError, ValueError):
+        return 0
+    if not math.isfinite(scale) or scale <= 0:
+        return 0
+    level = 0
+    for i, tolerance in enumerate(LOD_TOLERANCES, start=1):
+        if tolerance * scale <= LOD_MAX_SCREEN_ERROR_PX:
+            level = i
+    return level
+
+
+def max_scale_for_level(level):
+    """Maior escala em que o nível ainda é aceitável; acima dela o cliente deve pedir mais detalhe."""
+    if level <= 0:
+        return None
+    return LOD_MAX_SCREEN_ERROR_PX / LOD_TOLERANCES[level - 1]
+
+
+def points_for_level(points_json, lod_json, level):
+    """Pontos do traço no nível pedido, ou no nível mais fino disponível abaixo dele."""
+    if level > 0 and lod_json:
+        levels = json.loads(lod_json)
+        for i in range(min(level, len(levels)), 0, -1):
+            if levels[i - 1] is not None:
+                return levels[i - 1]
+    return json.loads(points_json)
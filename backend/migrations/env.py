@@ -45,6 +45,15 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # Partições de `stroke` (stroke_p0, stroke_p1, ...) são criadas pela migração
+    # e7b3f0a91c64 e não existem nos modelos; o autogenerate não deve removê-las.
+    table = object if type_ == 'table' else getattr(object, 'table', None)
+    if reflected and compare_to is None and table is not None and table.name.startswith('stroke_p'):
+        return False
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -93,6 +102,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
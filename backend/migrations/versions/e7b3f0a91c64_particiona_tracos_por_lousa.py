@@ -0,0 +1,93 @@
+"""Particiona a tabela de traços por lousa (opcional, só PostgreSQL)
+
+Revision ID: e7b3f0a91c64
+Revises: c52a9e17d4b3
+Create Date: 2025-07-11 09:03:26.871450
+
+Em todos os bancos cria o índice (whiteboard_id, id), usado ao carregar e apagar
+os traços de uma lousa.
+
+No PostgreSQL, com STROKE_PARTITIONS=N (N > 1) no ambiente, `stroke` é recriada
+particionada por HASH(whiteboard_id) em N partições e os dados são copiados. A
+chave primária passa a ser (id, whiteboard_id), exigência do particionamento; o
+`id` continua vindo da mesma sequence e segue único. Sem a variável (ou no SQLite)
+a tabela fica como está.
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3f0a91c64'
+down_revision = 'c52a9e17d4b3'
+branch_labels = None
+depends_on = None
+
+STROKE_COLUMNS = 'id, user_id, whiteboard_id, color, line_width, points_json, lod_json, created_at'
+
+
+def _is_partitioned(bind):
+    return bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = 'stroke'"
+    )).first() is not None
+
+
+def upgrade():
+    bind = op.get_bind()
+    partitions = int(os.environ.get('STROKE_PARTITIONS', '0') or 0)
+
+    if bind.dialect.name == 'postgresql' and partitions > 1:
+        op.execute("ALTER TABLE stroke RENAME TO stroke_unpartitioned")
+        op.execute("ALTER INDEX stroke_pkey RENAME TO stroke_unpartitioned_pkey")
+        op.execute("""
+            CREATE TABLE stroke (
+                id INTEGER NOT NULL DEFAULT nextval('stroke_id_seq'),
+                user_id VARCHAR(255) NOT NULL REFERENCES users (id),
+                whiteboard_id INTEGER NOT NULL REFERENCES whiteboards (id),
+                color VARCHAR(7) NOT NULL,
+                line_width FLOAT NOT NULL,
+                points_json TEXT NOT NULL,
+                lod_json TEXT,
+                created_at TIMESTAMP WITHOUT TIME ZONE,
+                CONSTRAINT stroke_pkey PRIMARY KEY (id, whiteboard_id)
+            ) PARTITION BY HASH (whiteboard_id)
+        """)
+        for remainder in range(partitions):
+            op.execute(
+                f"CREATE TABLE stroke_p{remainder} PARTITION OF stroke "
+                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            )
+        op.execute(f"INSERT INTO stroke ({STROKE_COLUMNS}) SELECT {STROKE_COLUMNS} FROM stroke_unpartitioned")
+        # A sequence pertencia à tabela antiga e seria apagada junto com ela
+        op.execute("ALTER SEQUENCE stroke_id_seq OWNED BY stroke.id")
+        op.execute("DROP TABLE stroke_unpartitioned")
+
+    op.create_index('ix_stroke_whiteboard_id_id', 'stroke', ['whiteboard_id', 'id'], unique=False)
+
+
+def downgrade():
+    bind = op.get_bind()
+    op.drop_index('ix_stroke_whiteboard_id_id', table_name='stroke')
+
+    if bind.dialect.name == 'postgresql' and _is_partitioned(bind):
+        op.execute("ALTER TABLE stroke RENAME TO stroke_partitioned")
+        op.execute("ALTER INDEX stroke_pkey RENAME TO stroke_partitioned_pkey")
+        op.execute("""
+            CREATE TABLE stroke (
+                id INTEGER NOT NULL DEFAULT nextval('stroke_id_seq'),
+                user_id VARCHAR(255) NOT NULL,
+                whiteboard_id INTEGER NOT NULL REFERENCES whiteboards (id),
+                color VARCHAR(7) NOT NULL,
+                line_width FLOAT NOT NULL,
+                points_json TEXT NOT NULL,
+                lod_json TEXT,
+                created_at TIMESTAMP WITHOUT TIME ZONE,
+                CONSTRAINT stroke_pkey PRIMARY KEY (id),
+                CONSTRAINT fk_stroke_user_id FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        """)
+        op.execute(f"INSERT INTO stroke ({STROKE_COLUMNS}) SELECT {STROKE_COLUMNS} FROM stroke_partitioned")
+        op.execute("ALTER SEQUENCE stroke_id_seq OWNED BY stroke.id")
+        op.execute("DROP TABLE stroke_partitioned")
@@ -0,0 +1,173 @@
+"""Modelos do banco e consultas de leitura compartilhadas."""
+import datetime
+import json
+
+import board_list_cache
+from database import read_engine
+from extensions import db
+
+DEFAULT_BOARD_ID = 1
+
+# Tabela de associação para o acesso do usuário aos quadros
+whiteboard_access = db.Table('whiteboard_access',
+    db.Column('user_id', db.String(255), db.ForeignKey('users.id'), primary_key=True),
+    db.Column('whiteboard_id', db.Integer, db.ForeignKey('whiteboards.id'), primary_key=True)
+)
+
+class User(db.Model):
+    __tablename__ = 'users'
+
+    id = db.Column(db.String(255), primary_key=True) # Google's user ID
+    name = db.Column(db.String(255), nullable=False)
+    email = db.Column(db.String(255), unique=True, nullable=False)
+    profile_pic = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    is_guest = db.Column(db.Boolean, default=False, nullable=False)
+    # Muda sempre que a lista de lousas do usuário muda; vira o ETag de GET /api/whiteboards
+    boards_version = db.Column(db.Integer, default=0, nullable=False)
+    boards_updated_at = db.Column(db.DateTime, nullable=True)
+
+    owned_whiteboards = db.relationship('Whiteboard', backref='owner', lazy='dynamic')
+    accessible_whiteboards = db.relationship('Whiteboard', secondary=whiteboard_access, back_populates='accessible_by_users', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<User id={self.id} name={self.name}>'
+
+class Whiteboard(db.Model):
+    __tablename__ = 'whiteboards'
+
+    id = db.Column(db.Integer, primary_key=True)
+    nickname = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    owner_id = db.Column(db.String(255), db.ForeignKey('users.id'), nullable=False)
+    
+    # passive_deletes: apagar a lousa não carrega os traços; use delete_whiteboard_rows()
+    strokes = db.relationship('Stroke', backref='whiteboard', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    accessible_by_users = db.relationship('User', secondary=whiteboard_access, back_populates='accessible_whiteboards', lazy='dynamic')
+
+    def __repr__(self):
+        return f'<Whiteboard id={self.id} nickname={self.nickname}>'
+
+class Stroke(db.Model):
+    __tablename__ = 'stroke' # Nome explícito da tabela
+    # No PostgreSQL a tabela pode estar particionada por whiteboard_id (ver migração e7b3f0a91c64)
+    __table_args__ = (
+        db.Index('ix_stroke_whiteboard_id_id', 'whiteboard_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(255), db.ForeignKey('users.id'), nullable=False)
+    whiteboard_id = db.Column(db.Integer, db.ForeignKey('whiteboards.id'), nullable=False)
+    
+    color = db.Column(db.String(7), nullable=False) # Ex: #RRGGBB
+    line_width = db.Column(db.Float, nullable=False)
+    
+    points_json = db.Column(db.Text, nullable=False) # [{"x":10,"y":20},{"x":12,"y":22}, ...]
+    lod_json = db.Column(db.Text, nullable=True) # [pontos_nivel_1, pontos_nivel_2, ...] (ver lod.py)
+
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow) # Quando o traço foi concluído/salvo
+
+    def __repr__(self):
+        return f'<Stroke id={self.id} board_id={self.whiteboard_id} color={self.color}>'
+
+class BoardEvent(db.Model):
+    """Histórico append-only das mutações de uma lousa (nunca é atualizado nem apagado por undo/borracha)."""
+    __tablename__ = 'board_events'
+    __table_args__ = (
+        db.Index('ix_board_events_whiteboard_id_id', 'whiteboard_id', 'id'),
+        db.Index('ix_board_events_whiteboard_id_created_at', 'whiteboard_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    whiteboard_id = db.Column(db.Integer, db.ForeignKey('whiteboards.id'), nullable=False)
+    op = db.Column(db.String(16), nullable=False) # 'add', 'remove' ou 'clear'
+    stroke_id = db.Column(db.Integer, nullable=True)
+    user_id = db.Column(db.String(255), nullable=True)
+    payload_json = db.Column(db.Text, nullable=True) # Traço completo, apenas em 'add'
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<BoardEvent id={self.id} board_id={self.whiteboard_id} op={self.op}>'
+
+class BoardCheckpoint(db.Model):
+    """Estado completo de uma lousa após o evento `last_event_id`, para não reaplicar o histórico inteiro."""
+    __tablename__ = 'board_checkpoints'
+    __table_args__ = (
+        db.Index('ix_board_checkpoints_whiteboard_id_created_at', 'whiteboard_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    whiteboard_id = db.Column(db.Integer, db.ForeignKey('whiteboards.id'), nullable=False)
+    last_event_id = db.Column(db.Integer, nullable=False) # 0 = estado anterior ao início do histórico
+    strokes_json = db.Column(db.Text, nullable=True) # Formato antigo: lista JSON dos traços
+    strokes_blob = db.Column(db.LargeBinary, nullable=True) # Uma linha `id<TAB>json` por traço, comprimido com zlib (ver history.py)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<BoardCheckpoint id={self.id} board_id={self.whiteboard_id} last_event_id={self.last_event_id}>'
+
+class BoardArchive(db.Model):
+    """Traços de uma lousa inativa compactados em um único registro (ver archive_idle_boards)."""
+    __tablename__ = 'board_archives'
+
+    whiteboard_id = db.Column(db.Integer, db.ForeignKey('whiteboards.id'), primary_key=True)
+    strokes_blob = db.Column(db.LargeBinary, nullable=False) # JSON das linhas de `stroke`, comprimido com zlib
+    stroke_count = db.Column(db.Integer, nullable=False)
+    raw_bytes = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<BoardArchive board_id={self.whiteboard_id} strokes={self.stroke_count}>'
+
+def read_execute(statement):
+    """Executa uma consulta somente leitura, na réplica quando houver uma configurada.
+
+    Escritas continuam indo para o primário pela sessão normal. Como a réplica pode
+    estar alguns instantes atrasada, use apenas para leituras que toleram isso.
+    """
+    return db.session.execute(statement, bind_arguments={'bind': read_engine(db)})
+
+def has_board_access(user_id, board_id):
+    """Verifica direto na tabela de associação, sem carregar a lista de usuários da lousa."""
+    return read_execute(
+        db.select(whiteboard_access.c.user_id).where(
+            whiteboard_access.c.user_id == user_id,
+            whiteboard_access.c.whiteboard_id == board_id,
+        )
+    ).first() is not None
+
+def stroke_to_dict(stroke):
+    return {
+        'id': stroke.id,
+        'user_id': stroke.user_id,
+        'color': stroke.color,
+        'lineWidth': stroke.line_width,
+        'points': json.loads(stroke.points_json)
+    }
+
+def bump_boards_version(user_ids):
+    """Marca a lista de lousas destes usuários como alterada. O commit fica com quem chamou."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    db.session.execute(
+        db.update(User).where(User.id.in_(user_ids)).values(
+            boards_version=User.boards_version + 1,
+            boards_updated_at=datetime.datetime.utcnow(),
+        )
+    )
+    board_list_cache.invalidate(user_ids)
+
+def delete_whiteboard_rows(board_id):
+    """Apaga uma lousa e tudo que depende dela com DELETEs por conjunto, sem carregar objetos.
+
+    Com a tabela `stroke` particionada, o DELETE dos traços só toca a partição da lousa.
+    O commit fica com quem chamou.
+    """
+    bump_boards_version(db.session.execute(
+        db.select(whiteboard_access.c.user_id).where(whiteboard_access.c.whiteboard_id == board_id)
+    ).scalars())
+    for model in (Stroke, BoardEvent, BoardCheckpoint, BoardArchive):
+        db.session.execute(db.delete(model).where(model.whiteboard_id == board_id))
+    db.session.execute(db.delete(whiteboard_access).where(whiteboard_access.c.whiteboard_id == board_id))
+    db.session.execute(db.delete(Whiteboard).where(Whiteboard.id == board_id))
@@ -0,0 +1,186 @@
+"""Quem está em cada lousa: entrada, saída, ocioso/ativo e expiração por heartbeat.
+
+Cada conexão (sid) em uma sala `board_{id}` ganha um índice pequeno `i`, único na
+sala; a numeração recomeça quando a sala esvazia. A identidade (usuário, nome, foto) vai uma única vez: no `presence_snapshot`
+para quem entra e no `presence_diff` para quem já estava. Depois disso os cursores
+viajam só com `{board_id, i, x, y}`.
+
+O registro fica no store compartilhado (store.py), então todos os workers veem a
+mesma lista. Um participante sem heartbeat há PRESENCE_EXPIRY_SECONDS sai da sala;
+sem cursor, traço ou desenho há PRESENCE_IDLE_SECONDS fica ocioso (`idle`).
+"""
+import os
+import time
+
+from store import create_store
+
+PRESENCE_HEARTBEAT_SECONDS = int(os.environ.get('PRESENCE_HEARTBEAT_SECONDS', '15'))
+PRESENCE_EXPIRY_SECONDS = int(os.environ.get('PRESENCE_EXPIRY_SECONDS', '45'))
+PRESENCE_IDLE_SECONDS = int(os.environ.get('PRESENCE_IDLE_SECONDS', '60'))
+PRESENCE_SWEEP_SECONDS = int(os.environ.get('PRESENCE_SWEEP_SECONDS', '5'))
+# Atividade contínua (cursor) só é gravada no store a cada tantos segundos
+_ACTIVITY_WRITE_SECONDS = 5
+
+ROOMS_KEY = 'presence:rooms'
+
+store = create_store()
+# Conexões deste worker: sid -> {'board_id', 'entry', 'written'}
+local_sessions = {}
+
+
+def _room_key(board_id):
+    return f"presence:board_{board_id}"
+
+
+def _counter_key(board_id):
+    return f"{_room_key(board_id)}:next"
+
+
+def _public(entry):
+    return {key: entry[key] for key in ('i', 'user_id', 'name', 'pic', 'state')}
+
+
+def _emit_diff(socketio, board_id, joined=(), left=(), states=None, skip_sid=None):
+    socketio.emit('presence_diff', {
+        'board_id': board_id,
+        'joined': list(joined),
+        'left': list(left),
+        'state': states or {},
+    }, to=f"board_{board_id}", skip_sid=skip_sid)
+
+
+def send_snapshot(socketio, sid, board_id):
+    session = local_sessions[sid]
+    participants = [_public(entry) for entry in store.hgetall(_room_key(board_id)).values()]
+    socketio.emit('presence_snapshot', {
+        'board_id': board_id,
+        'you': session['entry']['i'],
+        'participants': sorted(participants, key=lambda p: p['i']),
+        'heartbeat_seconds': PRESENCE_HEARTBEAT_SECONDS,
+    }, to=sid)
+
+
+def join(socketio, sid, board_id, user):
+    """Registra a conexão na sala (já com join_room feito) e manda o snapshot para ela."""
+    session = local_sessions.get(sid)
+    if session and session['board_id'] == board_id and store.hget(_room_key(board_id), sid):
+        # Reentrada na mesma lousa (ex.: pedido de mais detalhe): só reenvia a lista
+        send_snapshot(socketio, sid, board_id)
+        return session['entry']['i']
+    if session:
+        leave(socketio, sid)
+
+    now = time.time()
+    entry = {
+        'user_id': user.id,
+        'name': user.name,
+        'pic': user.profile_pic,
+        'state': 'active',
+        'seen': now,
+        'active_at': now,
+    }
+    store.hset_numbered(_room_key(board_id), sid, _counter_key(board_id), entry)
+    store.sadd(ROOMS_KEY, board_id)
+    local_sessions[sid] = {'board_id': board_id, 'entry': entry, 'written': now}
+
+    _emit_diff(socketio, board_id, joined=[_public(entry)], skip_sid=sid)
+    send_snapshot(socketio, sid, board_id)
+    return entry['i']
+
+
+def leave(socketio, sid):
+    session = local_sessions.pop(sid, None)
+    if session is None:
+        return
+    board_id = session['board_id']
+    # Se o sweeper já expirou a entrada, a saída já foi anunciada por ele
+    if store.hdel(_room_key(board_id), sid):
+        store.delete_if_empty(_counter_key(board_id), _room_key(board_id))
+        _emit_diff(socketio, board_id, left=[session['entry']['i']])
+
+
+def touch(socketio, sid, active):
+    """Heartbeat (active=False) ou atividade (cursor, traço). Devolve a sessão ou None."""
+    session = local_sessions.get(sid)
+    if session is None:
+        return None
+    entry = session['entry']
+    now = time.time()
+    entry['seen'] = now
+    if active:
+        entry['active_at'] = now
+    if now - session['written'] < _ACTIVITY_WRITE_SECONDS and not (active and entry['state'] == 'idle'):
+        return session
+
+    board_id = session['board_id']
+    stored = store.hget(_room_key(board_id), sid)
+    if stored is None:
+        # Expirou (ex.: a conexão ficou parada além do limite) mas voltou a falar: entra de
+        # novo com outro índice, já que o antigo pode ter sido reaproveitado se a sala esvaziou
+        entry['state'] = 'active' if active else entry['state']
+        store.hset_numbered(_room_key(board_id), sid, _counter_key(board_id), entry)
+        store.sadd(ROOMS_KEY, board_id)
+        session['written'] = now
+        _emit_diff(socketio, board_id, joined=[_public(entry)], skip_sid=sid)
+        send_snapshot(socketio, sid, board_id)
+        return session
+    elif active and stored['state'] == 'idle':
+        entry['state'] = 'active'
+        _emit_diff(socketio, board_id, states={entry['i']: 'active'})
+    else:
+        entry['state'] = stored['state']
+    store.hset(_room_key(board_id), sid, entry)
+    store.sadd(ROOMS_KEY, board_id)
+    session['written'] = now
+    return session
+
+
+def sweep(socketio):
+    """Expira quem parou de mandar heartbeat e marca como ocioso quem parou de interagir."""
+    now = time.time()
+    for board_id in store.smembers(ROOMS_KEY):
+        board_id = int(board_id)
+        entries = store.hgetall(_room_key(board_id))
+        if not entries:
+            store.srem(ROOMS_KEY, board_id)
+            store.delete_if_empty(_counter_key(board_id), _room_key(board_id))
+            continue
+        left = []
+        states = {}
+        for sid, entry in entries.items():
+            if now - entry['seen'] > PRESENCE_EXPIRY_SECONDS:
+                # Com vários workers, só quem removeu a entrada anuncia a saída
+                if store.hdel(_room_key(board_id), sid):
+                    left.append(entry['i'])
+            elif entry['state'] == 'active' and now - entry['active_at'] > PRESENCE_IDLE_SECONDS:
+                entry['state'] = 'idle'
+                store.hset(_room_key(board_id), sid, entry)
+                states[entry['i']] = 'idle'
+                if sid in local_sessions:
+                    local_sessions[sid]['entry']['state'] = 'idle'
+        if left:
+            store.delete_if_empty(_counter_key(board_id), _room_key(board_id))
+        if left or states:
+            _emit_diff(socketio, board_id, left=left, states=states)
+
+
+def board_has_participants(board_id):
+    """Há alguém na sala da lousa em qualquer worker?"""
+    return bool(store.hgetall(_room_key(board_id)))
+
+
+def report():
+    return {
+        'rooms': len(store.smembers(ROOMS_KEY)),
+        'local_connections': len(local_sessions),
+    }
+
+
+def presence_job_loop(socketio):
+    """Roda o sweep periodicamente em uma greenlet."""
+    while True:
+        socketio.sleep(PRESENCE_SWEEP_SECONDS)
+        try:
+            sweep(socketio)
+        except Exception as e:
+            print(f"Erro no job de presença: {e}")
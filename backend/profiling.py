@@ -0,0 +1,223 @@
+"""Profiler por amostragem e rastreio de eventos lentos, ambos opcionais.
+
+* Profiler: um timer SIGPROF (tempo de CPU do processo) amostra a pilha que estava
+  rodando a cada PROFILER_INTERVAL_MS. Com gevent todas as greenlets rodam na thread
+  principal, então a amostra pega quem estava com a CPU, inclusive o hub. O resultado
+  sai no formato "folded" (`frame;frame;frame N`), que o flamegraph.pl, o speedscope
+  e o inferno leem diretamente. É ligado e desligado em tempo de execução por
+  `POST /api/admin/profiler` ou `flask profiler start|stop`.
+* Eventos lentos: com SLOW_EVENT_THRESHOLD_MS > 0, cada handler Socket.IO decorado
+  com `trace_event` e cada rota HTTP são cronometrados. Os que passam do limite são
+  guardados (os últimos SLOW_EVENT_LOG_SIZE) com o tempo separado em banco,
+  serialização e emit; o resto fica em `other_ms`.
+"""
+import collections
+import contextlib
+import datetime
+import functools
+import hmac
+import math
+import os
+import signal
+import tempfile
+import time
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 0 desativa o rastreio de eventos lentos (e os listeners do SQLAlchemy)
+SLOW_EVENT_THRESHOLD_MS = float(os.environ.get('SLOW_EVENT_THRESHOLD_MS', '0'))
+SLOW_EVENT_LOG_SIZE = int(os.environ.get('SLOW_EVENT_LOG_SIZE', '100'))
+
+PROFILER_INTERVAL_MS = float(os.environ.get('PROFILER_INTERVAL_MS', '10'))
+# Limites do intervalo de amostragem: abaixo de 1 ms o próprio profiler domina a CPU
+PROFILER_MIN_INTERVAL_MS = 1.0
+PROFILER_MAX_INTERVAL_MS = 1000.0
+PROFILER_OUTPUT_DIR = os.environ.get('PROFILER_OUTPUT_DIR') or tempfile.gettempdir()
+# Sem token, os endpoints de administração do profiler ficam desligados
+PROFILER_ADMIN_TOKEN = os.environ.get('PROFILER_ADMIN_TOKEN', '')
+
+PHASES = ('db', 'serialization', 'emit')
+
+slow_events = collections.deque(maxlen=SLOW_EVENT_LOG_SIZE)
+
+profiler_state = {
+    'running': False,
+    'started_at': None,
+    'interval_ms': None,
+    'samples': 0,
+    'last_output': None,
+}
+_stacks = collections.Counter()
+
+
+# --- Profiler por amostragem ------------------------------------------------------
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _sample(signum, frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    if labels:
+        _stacks[';'.join(reversed(labels))] += 1
+        profiler_state['samples'] += 1
+
+
+def profiler_interval_ms(value=None):
+    """Intervalo de amostragem em ms, limitado a [PROFILER_MIN_INTERVAL_MS, PROFILER_MAX_INTERVAL_MS].
+
+    Levanta ValueError se o valor não for um número finito.
+    """
+    try:
+        interval_ms = float(PROFILER_INTERVAL_MS if value is None else value)
+    except TypeError as e:
+        raise ValueError(f"Intervalo inválido: {value!r}") from e
+    if not math.isfinite(interval_ms):
+        raise ValueError(f"Intervalo inválido: {value!r}")
+    return min(max(interval_ms, PROFILER_MIN_INTERVAL_MS), PROFILER_MAX_INTERVAL_MS)
+
+
+def start_profiler(interval_ms=None):
+    """Liga o timer de amostragem. Precisa rodar na thread principal (o caso com gevent)."""
+    if profiler_state['running']:
+        return False
+    interval = profiler_interval_ms(interval_ms) / 1000.0
+    _stacks.clear()
+    # O timer é armado antes do handler para que uma falha não deixe o handler instalado;
+    # o SIGPROF fica bloqueado no meio tempo (a ação padrão dele encerra o processo)
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGPROF})
+    try:
+        signal.setitimer(signal.ITIMER_PROF, interval, interval)
+        try:
+            signal.signal(signal.SIGPROF, _sample)
+        except Exception:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            raise
+    finally:
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, {signal.SIGPROF})
+    profiler_state.update(running=True, started_at=datetime.datetime.utcnow().isoformat(),
+                          interval_ms=interval * 1000, samples=0)
+    return True
+
+
+def stop_profiler():
+    """Desliga o timer e grava as pilhas no formato folded. Devolve o caminho do arquivo."""
+    if not profiler_state['running']:
+        return None
+    signal.setitimer(signal.ITIMER_PROF, 0, 0)
+    signal.signal(signal.SIGPROF, signal.SIG_DFL)
+    profiler_state['running'] = False
+
+    path = os.path.join(PROFILER_OUTPUT_DIR, f"profile-{datetime.datetime.utcnow():%Y%m%d-%H%M%S}.folded")
+    with open(path, 'w') as output:
+        output.write(folded_stacks())
+    profiler_state['last_output'] = path
+    return path
+
+
+def folded_stacks():
+    return ''.join(f"{stack} {count}\n" for stack, count in _stacks.most_common())
+
+
+def admin_token_valid(token):
+    return bool(PROFILER_ADMIN_TOKEN) and hmac.compare_digest(token or '', PROFILER_ADMIN_TOKEN)
+
+
+# --- Eventos lentos -----------------------------------------------------------------
+
+def _current_trace():
+    return g.get('_slow_trace') if has_app_context() else None
+
+
+def _begin_trace():
+    g._slow_trace = dict.fromkeys(PHASES, 0.0)
+    g._slow_trace.update(db_queries=0, started=time.perf_counter())
+
+
+def _finish_trace(kind, name):
+    trace = g.pop('_slow_trace', None)
+    if trace is None:
+        return
+    total_ms = (time.perf_counter() - trace['started']) * 1000
+    if total_ms < SLOW_EVENT_THRESHOLD_MS:
+        return
+
+    record = {
+        'kind': kind,
+        'name': name,
+        'at': datetime.datetime.utcnow().isoformat(),
+        'duration_ms': round(total_ms, 2),
+        'db_queries': trace['db_queries'],
+    }
+    for phase_name in PHASES:
+        record[f'{phase_name}_ms'] = round(trace[phase_name] * 1000, 2)
+    record['other_ms'] = round(total_ms - sum(trace[p] for p in PHASES) * 1000, 2)
+    slow_events.append(record)
+    print(f"Evento lento {kind} '{name}': {record['duration_ms']} ms "
+          f"(banco {record['db_ms']} ms em {record['db_queries']} consultas, "
+          f"serialização {record['serialization_ms']} ms, emit {record['emit_ms']} ms)")
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Soma o tempo do bloco à fase do evento em andamento, se houver um.
+
+    Consultas feitas dentro do bloco já contam em `db` e são descontadas aqui.
+    """
+    trace = _current_trace()
+    if trace is None:
+        yield
+        return
+    db_before = trace['db']
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace[name] += time.perf_counter() - started - (trace['db'] - db_before)
+
+
+def trace_event(name):
+    """Decorador para handlers Socket.IO (aplicado abaixo do `@socketio.on`)."""
+    def decorator(handler):
+        if SLOW_EVENT_THRESHOLD_MS <= 0:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            _begin_trace()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                _finish_trace('socket', name)
+        return wrapper
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_trace() is not None:
+        conn.info.setdefault('_slow_trace_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _current_trace()
+    started = conn.info.get('_slow_trace_started')
+    if trace is not None and started:
+        trace['db'] += time.perf_counter() - started.pop()
+        trace['db_queries'] += 1
+
+
+def init_app(app):
+    """Liga o rastreio das rotas HTTP e o tempo de banco, se SLOW_EVENT_THRESHOLD_MS > 0."""
+    if SLOW_EVENT_THRESHOLD_MS <= 0:
+        return
+    app.before_request(_begin_trace)
+    app.teardown_request(lambda exc: _finish_trace('http', request.endpoint or request.path))
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
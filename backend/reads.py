@@ -0,0 +1,78 @@
+"""Leituras do caminho de entrada em uma lousa (join_board), com o mínimo de idas ao banco.
+
+* `join_context`: usuário, lousa, dono, acesso e arquivamento saem de uma única
+  consulta, em vez de cinco (usuário, lousa, acesso, arquivo e dono).
+* `initial_drawing_json`: os traços são lidos como projeção de colunas, sem montar
+  objetos `Stroke` nem passar pelo identity map, e o `points_json` guardado entra como
+  está no texto do payload. Decodificar e reserializar os pontos era a maior parte do
+  tempo do join em lousas grandes.
+"""
+import json
+
+import lod
+from database import replica_enabled
+from extensions import db
+from models import BoardArchive, Stroke, User, Whiteboard, read_execute, whiteboard_access
+from profiling import phase
+from retention import stroke_conditions
+
+
+def join_context(board_id, user_email):
+    """Tudo o que o join precisa saber antes de ler os traços, em uma consulta.
+
+    Se a réplica disser que não (usuário, lousa ou acesso faltando), a consulta é
+    refeita no primário antes de recusar. Devolve (contexto, lido_do_primário); o
+    contexto é None se o usuário não existe. Senão, uma linha com `id`, `name`,
+    `profile_pic` e `is_guest` do usuário (serve como usuário para presence.join) e
+    `board_id` (None se a lousa não existe), `owner_is_guest`, `has_access` e `archived`.
+    """
+    owner = db.aliased(User)
+    query = (
+        db.select(
+            User.id, User.name, User.profile_pic, User.is_guest,
+            Whiteboard.id.label('board_id'),
+            owner.is_guest.label('owner_is_guest'),
+            db.exists().where(
+                whiteboard_access.c.user_id == User.id,
+                whiteboard_access.c.whiteboard_id == Whiteboard.id,
+            ).label('has_access'),
+            db.exists().where(BoardArchive.whiteboard_id == Whiteboard.id).label('archived'),
+        )
+        .select_from(User)
+        .outerjoin(Whiteboard, Whiteboard.id == board_id)
+        .outerjoin(owner, owner.id == Whiteboard.owner_id)
+        .where(User.email == user_email)
+    )
+    context = read_execute(query).first()
+    if replica_enabled(db) and (not context or context.board_id is None or not context.has_access):
+        # A réplica pode ainda não ter o usuário, a lousa recém-criada ou o compartilhamento
+        return db.session.execute(query).first(), True
+    return context, False
+
+
+def initial_drawing_json(execute, board_id, owner_is_guest, lod_level):
+    """Texto JSON do `initial_drawing`, já com a política de retenção aplicada na leitura."""
+    conditions, max_strokes = stroke_conditions(board_id, owner_is_guest)
+    columns = [Stroke.id, Stroke.user_id, Stroke.color, Stroke.line_width, Stroke.points_json]
+    if lod_level > 0:
+        columns.append(Stroke.lod_json)
+    query = db.select(*columns).where(Stroke.whiteboard_id == board_id, *conditions)
+    if max_strokes:
+        rows = execute(query.order_by(Stroke.id.desc()).limit(max_strokes)).all()[::-1]
+    else:
+        rows = execute(query.order_by(Stroke.id)).all()
+
+    dumps = json.dumps
+    with phase('serialization'):
+        strokes = []
+        for row in rows:
+            points = row[4]
+            if lod_level > 0 and row[5]:
+                # Só os níveis de detalhe precisam ser decodificados, e são bem menores
+                points = dumps(lod.points_for_level(points, row[5], lod_level), separators=(',', ':'))
+            strokes.append(
+                f'{{"id":{row[0]},"user_id":{dumps(row[1])},"color":{dumps(row[2])},'
+                f'"lineWidth":{dumps(row[3])},"points":{points}}}'
+            )
+        meta = dumps({'lod_level': lod_level, 'lod_max_scale': lod.max_scale_for_level(lod_level)}, separators=(',', ':'))
+        return f'{{"strokes":[{",".join(strokes)}],{meta[1:]}'
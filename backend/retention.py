@@ -0,0 +1,237 @@
+"""Políticas de retenção dos traços e das lousas de convidados.
+
+Cada tipo de lousa tem sua política, lida do ambiente:
+
+* `default`: a lousa principal (ID 1), que recebe traços de todos os visitantes;
+* `guest`: lousas cujo dono é um convidado;
+* `regular`: as demais lousas.
+
+`max_age_days` descarta traços mais antigos que o limite, `max_strokes` mantém só os
+N traços mais recentes da lousa e, para lousas de convidados, `expire_board_days`
+apaga a lousa inteira depois de N dias sem atividade. Além disso,
+RETENTION_GUEST_STROKE_MAX_AGE_DAYS descarta traços feitos por convidados em
+qualquer lousa. Limites vazios ou 0 desativam a regra.
+
+A limpeza roda em lotes de RETENTION_BATCH_SIZE linhas, com um commit por lote; cada
+lote registra os `remove` no histórico e avisa as salas abertas. Como
+pode atrasar, a entrada em uma lousa aplica os mesmos filtros na consulta
+(stroke_conditions), e assim nunca lê dados já vencidos.
+"""
+import datetime
+import os
+import time
+
+import compression
+import eraser
+from extensions import db, socketio
+from history import ensure_history_baseline, forget_board_history, maybe_checkpoint_board, record_board_event
+from models import DEFAULT_BOARD_ID, BoardEvent, Stroke, User, Whiteboard, delete_whiteboard_rows
+
+
+def _env_limit(name):
+    value = os.environ.get(name, '').strip()
+    return int(value) if value and int(value) > 0 else None
+
+
+RETENTION_POLICIES = {
+    'default': {
+        'max_age_days': _env_limit('RETENTION_DEFAULT_BOARD_MAX_AGE_DAYS'),
+        'max_strokes': _env_limit('RETENTION_DEFAULT_BOARD_MAX_STROKES'),
+    },
+    'guest': {
+        'max_age_days': _env_limit('RETENTION_GUEST_BOARD_MAX_AGE_DAYS'),
+        'max_strokes': _env_limit('RETENTION_GUEST_BOARD_MAX_STROKES'),
+        'expire_board_days': _env_limit('RETENTION_GUEST_BOARD_EXPIRE_DAYS'),
+    },
+    'regular': {
+        'max_age_days': _env_limit('RETENTION_BOARD_MAX_AGE_DAYS'),
+        'max_strokes': _env_limit('RETENTION_BOARD_MAX_STROKES'),
+    },
+}
+GUEST_STROKE_MAX_AGE_DAYS = _env_limit('RETENTION_GUEST_STROKE_MAX_AGE_DAYS')
+
+RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', '1000'))
+# Intervalo do job de limpeza em segundos (0 desativa; o comando `flask purge_expired` continua disponível)
+RETENTION_INTERVAL_SECONDS = int(os.environ.get('RETENTION_INTERVAL_SECONDS', '0'))
+
+retention_stats = {
+    'strokes_purged': 0,
+    'boards_expired': 0,
+    'last_purge_seconds': None,
+}
+
+
+def _cutoff(days):
+    return datetime.datetime.utcnow() - datetime.timedelta(days=days)
+
+
+def board_kind(board_id, owner_is_guest):
+    if board_id == DEFAULT_BOARD_ID:
+        return 'default'
+    return 'guest' if owner_is_guest else 'regular'
+
+
+def _is_guest_stroke():
+    # Convidados removidos no disconnect somem de `users`, mas o id deles sempre começa com 'guest_'
+    return db.or_(
+        Stroke.user_id.in_(db.select(User.id).where(User.is_guest.is_(True))),
+        Stroke.user_id.startswith('guest_', autoescape=True),
+    )
+
+
+def stroke_conditions(board_id, owner_is_guest):
+    """Condições SQL e limite de traços que a política da lousa impõe às leituras.
+
+    Devolve (condições, max_strokes). Com max_strokes, quem lê deve pegar só os N
+    traços de maior id.
+    """
+    policy = RETENTION_POLICIES[board_kind(board_id, owner_is_guest)]
+    conditions = []
+    if policy['max_age_days']:
+        conditions.append(Stroke.created_at >= _cutoff(policy['max_age_days']))
+    if GUEST_STROKE_MAX_AGE_DAYS:
+        conditions.append(db.or_(
+            Stroke.created_at >= _cutoff(GUEST_STROKE_MAX_AGE_DAYS),
+            db.not_(_is_guest_stroke()),
+        ))
+    return conditions, policy['max_strokes']
+
+
+def _board_ids(kind):
+    query = db.select(Whiteboard.id).join(User, User.id == Whiteboard.owner_id)
+    if kind == 'default':
+        query = query.where(Whiteboard.id == DEFAULT_BOARD_ID)
+    else:
+        query = query.where(Whiteboard.id != DEFAULT_BOARD_ID, User.is_guest.is_(kind == 'guest'))
+    return query
+
+
+def _delete_in_batches(stroke_query, record=True):
+    """Apaga os traços selecionados por `stroke_query` (id, whiteboard_id) em lotes, com um commit por lote.
+
+    Com `record`, cada traço apagado vira um evento `remove` no histórico (que o
+    `board_at` e a geometria da borracha seguem) e as salas abertas recebem
+    `strokes_removed`, como na borracha.
+    """
+    total = 0
+    while True:
+        rows = db.session.execute(stroke_query.limit(RETENTION_BATCH_SIZE)).all()
+        if not rows:
+            return total
+        removed = {}
+        for stroke_id, board_id in rows:
+            removed.setdefault(board_id, []).append(stroke_id)
+        if record:
+            for board_id, stroke_ids in removed.items():
+                ensure_history_baseline(board_id)
+                for stroke_id in stroke_ids:
+                    record_board_event(board_id, 'remove', stroke_id=stroke_id)
+        db.session.execute(db.delete(Stroke).where(Stroke.id.in_([row[0] for row in rows])))
+        db.session.commit()
+        total += len(rows)
+        if record:
+            for board_id, stroke_ids in removed.items():
+                maybe_checkpoint_board(board_id)
+                compression.emit_to_board(socketio, 'strokes_removed', {'stroke_ids': stroke_ids, 'board_id': board_id}, board_id)
+        # Devolve a vez às outras greenlets entre um lote e outro
+        socketio.sleep(0)
+        if len(rows) < RETENTION_BATCH_SIZE:
+            return total
+
+
+def _purge_over_limit(kind, max_strokes):
+    """Mantém só os `max_strokes` traços mais recentes de cada lousa do tipo."""
+    total = 0
+    counts = db.session.execute(
+        db.select(Stroke.whiteboard_id, db.func.count(Stroke.id))
+        .where(Stroke.whiteboard_id.in_(_board_ids(kind)))
+        .group_by(Stroke.whiteboard_id)
+        .having(db.func.count(Stroke.id) > max_strokes)
+    ).all()
+    for board_id, count in counts:
+        # O traço mais antigo que ainda deve ficar; tudo abaixo dele sai
+        keep_from = db.session.execute(
+            db.select(Stroke.id).filter_by(whiteboard_id=board_id)
+            .order_by(Stroke.id.desc()).offset(max_strokes - 1).limit(1)
+        ).scalar()
+        total += _delete_in_batches(
+            db.select(Stroke.id, Stroke.whiteboard_id)
+            .where(Stroke.whiteboard_id == board_id, Stroke.id < keep_from).order_by(Stroke.id)
+        )
+    return total
+
+
+def _expire_guest_boards(days):
+    """Apaga lousas de convidados sem atividade há `days` dias, traços primeiro e em lotes."""
+    cutoff = _cutoff(days)
+    last_stroke = db.select(db.func.max(Stroke.created_at)).where(Stroke.whiteboard_id == Whiteboard.id).scalar_subquery()
+    last_event = db.select(db.func.max(BoardEvent.created_at)).where(BoardEvent.whiteboard_id == Whiteboard.id).scalar_subquery()
+    board_ids = db.session.execute(
+        _board_ids('guest').where(db.func.coalesce(last_event, last_stroke, Whiteboard.created_at) < cutoff)
+    ).scalars().all()
+
+    expired = 0
+    for board_id in board_ids:
+        # A lousa inteira some, com o histórico: não há eventos a registrar
+        _delete_in_batches(db.select(Stroke.id, Stroke.whiteboard_id).filter_by(whiteboard_id=board_id), record=False)
+        delete_whiteboard_rows(board_id)
+        db.session.commit()
+        forget_board_history(board_id)
+        eraser.forget_board_geometry(board_id)
+        expired += 1
+        print(f"Lousa de convidado {board_id} expirada e removida.")
+    return expired
+
+
+def purge_expired():
+    """Aplica todas as políticas de retenção. Devolve (traços removidos, lousas expiradas)."""
+    started = time.perf_counter()
+    strokes = 0
+    boards = 0
+    try:
+        for kind, policy in RETENTION_POLICIES.items():
+            if policy['max_age_days']:
+                strokes += _delete_in_batches(
+                    db.select(Stroke.id, Stroke.whiteboard_id).where(
+                        Stroke.whiteboard_id.in_(_board_ids(kind)),
+                        Stroke.created_at < _cutoff(policy['max_age_days']),
+                    ).order_by(Stroke.id)
+                )
+            if policy['max_strokes']:
+                strokes += _purge_over_limit(kind, policy['max_strokes'])
+
+        if GUEST_STROKE_MAX_AGE_DAYS:
+            strokes += _delete_in_batches(
+                db.select(Stroke.id, Stroke.whiteboard_id).where(
+                    _is_guest_stroke(),
+                    Stroke.created_at < _cutoff(GUEST_STROKE_MAX_AGE_DAYS),
+                ).order_by(Stroke.id)
+            )
+
+        if RETENTION_POLICIES['guest']['expire_board_days']:
+            boards += _expire_guest_boards(RETENTION_POLICIES['guest']['expire_board_days'])
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        retention_stats['strokes_purged'] += strokes
+        retention_stats['boards_expired'] += boards
+        retention_stats['last_purge_seconds'] = round(elapsed, 4)
+
+    return strokes, boards
+
+
+def retention_job_loop(app):
+    """Roda purge_expired periodicamente em uma greenlet."""
+    while True:
+        socketio.sleep(RETENTION_INTERVAL_SECONDS)
+        with app.app_context():
+            try:
+                strokes, boards = purge_expired()
+                if strokes or boards:
+                    print(f"Retenção: {strokes} traços e {boards} lousas removidos.")
+            except Exception as e:
+                print(f"Erro no job de retenção: {e}")
+            finally:
+                db.session.remove()
@@ -0,0 +1,136 @@
+"""Armazenamento de estado efêmero compartilhado (hoje, a presença nas lousas).
+
+Sem configuração, o estado fica na memória do processo, o que basta para um worker.
+Com SHARED_STATE_URL=redis://..., fica no Redis e é visto por todos os workers; o
+pacote `redis` só é necessário nesse caso. Os valores são dicionários serializáveis
+em JSON, agrupados em hashes (`key` -> `field` -> valor).
+"""
+import json
+import os
+
+SHARED_STATE_URL = os.environ.get('SHARED_STATE_URL', '')
+
+
+class MemoryStore:
+    """Hashes, contadores e conjuntos em estruturas do próprio processo."""
+
+    def __init__(self):
+        self._hashes = {}
+        self._counters = {}
+        self._sets = {}
+
+    def hget(self, key, field):
+        return self._hashes.get(key, {}).get(field)
+
+    def hset(self, key, field, value):
+        self._hashes.setdefault(key, {})[field] = value
+
+    def hdel(self, key, field):
+        """Remove o campo; devolve True só para quem de fato o removeu."""
+        fields = self._hashes.get(key)
+        if not fields or field not in fields:
+            return False
+        del fields[field]
+        if not fields:
+            del self._hashes[key]
+        return True
+
+    def hgetall(self, key):
+        return dict(self._hashes.get(key, {}))
+
+    def incr(self, key):
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    def hset_numbered(self, key, field, counter_key, value):
+        """Grava `value` com `value['i']` = próximo valor do contador; devolve o número."""
+        value['i'] = self.incr(counter_key)
+        self.hset(key, field, value)
+        return value['i']
+
+    def delete_if_empty(self, key, hash_key):
+        """Apaga `key` (ex.: um contador) se o hash `hash_key` estiver vazio."""
+        if not self._hashes.get(hash_key):
+            self._counters.pop(key, None)
+
+    def sadd(self, key, member):
+        self._sets.setdefault(key, set()).add(str(member))
+
+    def srem(self, key, member):
+        self._sets.get(key, set()).discard(str(member))
+
+    def smembers(self, key):
+        return set(self._sets.get(key, ()))
+
+
+class RedisStore:
+    """Mesma interface, com os valores em JSON no Redis.
+
+    As operações que combinam contador e hash rodam como scripts Lua, atômicas em
+    relação aos outros workers.
+    """
+
+    _HSET_NUMBERED = """
+        local value = cjson.decode(ARGV[2])
+        value['i'] = redis.call('INCR', KEYS[2])
+        redis.call('HSET', KEYS[1], ARGV[1], cjson.encode(value))
+        return value['i']
+    """
+    _DELETE_IF_EMPTY = """
+        if redis.call('HLEN', KEYS[2]) == 0 then
+            return redis.call('DEL', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url):
+        import redis
+
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._hset_numbered = self._redis.register_script(self._HSET_NUMBERED)
+        self._delete_if_empty = self._redis.register_script(self._DELETE_IF_EMPTY)
+
+    def hget(self, key, field):
+        value = self._redis.hget(key, field)
+        return json.loads(value) if value is not None else None
+
+    def hset(self, key, field, value):
+        self._redis.hset(key, field, json.dumps(value, separators=(',', ':')))
+
+    def hdel(self, key, field):
+        return self._redis.hdel(key, field) == 1
+
+    def hgetall(self, key):
+        return {field: json.loads(value) for field, value in self._redis.hgetall(key).items()}
+
+    def incr(self, key):
+        return self._redis.incr(key)
+
+    def hset_numbered(self, key, field, counter_key, value):
+        value['i'] = int(self._hset_numbered(keys=[key, counter_key], args=[field, json.dumps(value)]))
+        return value['i']
+
+    def delete_if_empty(self, key, hash_key):
+        self._delete_if_empty(keys=[key, hash_key])
+
+    def sadd(self, key, member):
+        self._redis.sadd(key, member)
+
+    def srem(self, key, member):
+        self._redis.srem(key, member)
+
+    def smembers(self, key):
+        return self._redis.smembers(key)
+
+
+def socketio_message_queue(url=None):
+    """Com o estado no Redis, os emits do Socket.IO também passam por ele para chegar a todos os workers."""
+    url = SHARED_STATE_URL if url is None else url
+    return url if url.startswith(('redis://', 'rediss://')) else None
+
+
+def create_store(url=None):
+    url = SHARED_STATE_URL if url is None else url
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(url)
+    return MemoryStore()
@@ -1,4 +1,7 @@
 from gevent import monkey
 monkey.patch_all()
 
-from app import app as application
\ No newline at end of file
+from app import create_app
+
+# Os jobs periódicos são iniciados pelo gunicorn.conf.py, não na importação
+application = create_app()